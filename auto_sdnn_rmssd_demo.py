@@ -1,374 +1,154 @@
-import os
-from typing import Optional
-import json
-import h5py
-import numpy as np
-import neurokit2 as nk
-import pandas as pd
-from openpyxl import load_workbook, Workbook
-from pathlib import Path
-import re
-from hrvanalysis  import get_time_domain_features, get_frequency_domain_features, get_poincare_plot_features
-from hrvanalysis.preprocessing import (
-    remove_outliers,
-    remove_ectopic_beats,
-    interpolate_nan_values
-)
-
-
-def resolve_eeg_mat_path(name: str, source_folder: str, verify_exists: bool = True) -> Optional[str]:
-    """
-    根据输入的名称生成对应的 .mat 文件路径。
-    参数:
-        name : str            输入名称 (如 'SLP014_Day2_up')
-        source_folder : str   目录路径
-        verify_exists : bool  是否检查文件是否真实存在
-
-    返回:
-        str | None  对应的文件绝对路径或 None
-    """
-    if not isinstance(name, str) or not name:
-        return None
-
-    parts = name.split('_')
-    if len(parts) < 2:
-        return None
-
-    subject = parts[0]  # 例如 SLP014
-
-    # Day1 情况
-    if parts[1] == 'Day1':
-        filename = f"{subject}_base_eeg_data.mat"
-
-    # up / down 情况
-    elif len(parts) >= 3 and parts[2] in ('up', 'down'):
-        # 如果要去掉首字母 S，改为 subject[1:]
-        filename = f"{subject}_{parts[2]}_eeg_data.mat"
-    else:
-        return None
-
-    full_path = os.path.join(source_folder, filename)
-
-    if verify_exists and not os.path.isfile(full_path):
-        return None
-
-    return full_path
-
-def load_dict_from_json(file_path: str) -> dict:
-    """
-    从 JSON 文件加载字典。
-
-    :param file_path: JSON 文件的路径。
-    :return: 加载后的字典，如果文件不存在或出错则返回空字典。
-    """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as json_file:
-            data = json.load(json_file)
-        print(f"字典已从 {file_path} 加载。")
-        return data
-    except FileNotFoundError:
-        print(f"错误: 文件 '{file_path}' 未找到。")
-        return {}
-    except json.JSONDecodeError:
-        print(f"错误: 文件 '{file_path}' 不是有效的 JSON 格式。")
-        return {}
-
-def get_ecg(mat_path):
-    """
-    输入: mat_path (.mat 文件路径，HDF5格式，包含键 'Totol_data')
-    输出: 第7列(索引6)的 ecg_data ndarray
-    """
-    with h5py.File(mat_path, 'r') as f:
-        dataset = f['Totol_data']
-        data_np = dataset[:]
-        ecg_data = data_np[:, 6]
-        return ecg_data
-
-def compute_hrv_features(rr_intervals_ms):
-    """清理 RR 间期并计算 HRV 特征"""
-    # --- 清理 ---
-
-    rr_clean = remove_outliers(rr_intervals_ms, low_rri=300, high_rri=2000)
-    rr_clean = remove_ectopic_beats(rr_clean, method="kamath")
-    rr_clean = interpolate_nan_values(rr_clean, interpolation_method="linear")
-
-    print(f"rr_clean的数据类型为：{type(rr_clean)}")
-    print(f"rr_clean的值为：{rr_clean}")
-
-    # --- HRV 特征 ---
-    features = {}
-    features.update(get_time_domain_features(rr_intervals_ms))
-    return features
-
-def hrv_sliding_windows(ecg_data, sampling_rate, window_minutes=5, step_seconds=60):
-    """
-    使用简单滑窗（固定窗口、固定步长）计算每个窗口的 SDNN 和 RMSSD。
-
-    参数：
-    ecg_data：需计算的心电数据
-    sampling_rate：采样率
-    window_miutes:时间窗
-    step_seconds：步长
-
-    返回:
-        SDNN_list, RMSSD_list
-    """
-
-    window_len = int(window_minutes * 60 * sampling_rate)  # 窗口大小
-    step_len = int(step_seconds * sampling_rate)           # 步长大小
-    n_windows = (len(ecg_data) - window_len) // step_len + 1
-    print(f"心电的长度为{len(ecg_data)},窗口的大小为{window_len},步长大小为{step_len}")
-
-    #print(f"窗口数量: {n_windows}")
-
-    SDNN_list = []
-    RMSSD_list = []
-
-    for w in range(n_windows):
-        start = w * step_len
-        end = start + window_len
-        ecg_segment = ecg_data[start:end]
-
-        # --- R 峰检测 ---
-        _, rpeak_info = nk.ecg_peaks(ecg_segment, sampling_rate=sampling_rate)
-        rpeaks = rpeak_info["ECG_R_Peaks"]
-
-        if len(rpeaks) < 2:
-            SDNN_list.append(np.nan)
-            RMSSD_list.append(np.nan)
-            continue
-
-        # --- RR 间期 (ms) ---
-        rpeaks_times = np.array(rpeaks) / sampling_rate
-        rr_intervals_ms = np.diff(rpeaks_times) * 1000
-
-        # --- 使用你的函数清理 RR + 提取特征 ---
-        features = compute_hrv_features(rr_intervals_ms)
-
-        # --- 仅取 SDNN 和 RMSSD ---
-        SDNN = features.get("sdnn", np.nan)
-        RMSSD = features.get("rmssd", np.nan)
-
-        SDNN_list.append(SDNN)
-        RMSSD_list.append(RMSSD)
-
-        print(f"窗口 {w}: SDNN={SDNN:.2f}, RMSSD={RMSSD:.2f}")
-
-    return SDNN_list, RMSSD_list
-
-def hrv_sliding_windows(ecg_data, sampling_rate, window_minutes=5, step_seconds=30):
-    """
-    使用简单滑窗（固定窗口、固定步长）计算每个窗口的 SDNN 和 RMSSD。
-
-    参数：
-    ecg_data：需计算的心电数据
-    sampling_rate：采样率
-    window_miutes:时间窗
-    step_seconds：步长
-
-    返回:
-        SDNN_list, RMSSD_list
-    """
-
-    window_len = int(window_minutes * 60 * sampling_rate)  # 窗口大小
-    step_len = int(step_seconds * sampling_rate)           # 步长大小
-    n_windows = (len(ecg_data) - window_len) // step_len + 1
-    print(len(ecg_data), window_len, step_len)
-
-    print(f"窗口数量: {n_windows}")
-
-    SDNN_list = []
-    RMSSD_list = []
-
-    for w in range(n_windows):
-        start = w * step_len
-        end = start + window_len
-        ecg_segment = ecg_data[start:end]
+# function: 批量计算各被试刺激配对区间的滑窗 SDNN/RMSSD（pairs_path_2.json → results.h5 → SDNN.xlsx / RMSSD.xlsx），
+#           计算函数在 hrv_core.py，这里只保留路径参数和批处理流程
+# author: Zhangsong
 
-        # --- R 峰检测 ---
-        _, rpeak_info = nk.ecg_peaks(ecg_segment, sampling_rate=sampling_rate)
-        rpeaks = rpeak_info["ECG_R_Peaks"]
-
-        if len(rpeaks) < 2:
-            SDNN_list.append(np.nan)
-            RMSSD_list.append(np.nan)
-            continue
-
-        # --- RR 间期 (ms) ---
-        rpeaks_times = np.array(rpeaks) / sampling_rate
-        rr_intervals_ms = np.diff(rpeaks_times) * 1000
-
-        # --- 使用你的函数清理 RR + 提取特征 ---
-        features = compute_hrv_features(rr_intervals_ms)
-
-        # --- 仅取 SDNN 和 RMSSD ---
-        SDNN = features.get("sdnn", np.nan)
-        RMSSD = features.get("rmssd", np.nan)
-
-        SDNN_list.append(SDNN)
-        RMSSD_list.append(RMSSD)
-
-        print(f"窗口 {w}: SDNN={SDNN:.2f}, RMSSD={RMSSD:.2f}")
-
-    return SDNN_list, RMSSD_list
-
-def append_column_to_excel_no_align(filepath, col_name, values, sheet_name="Sheet1"):
-    """
-    追加一列到现有Excel的指定工作表右侧，不做行对齐。
-    - 第1行写表头（col_name）
-    - 第2行开始写数据（values）
-    - 如果新列更长会自动扩展行，如果更短则该列下方留空
-    """
-    filepath = Path(filepath)
-
-    #values = list(values)
-    try:
-        values = list(values)
-    except TypeError:
-        print(f"⚠ 跳过写入列，无法转换为列表")
-        return
-
-    if filepath.exists():
-        wb = load_workbook(filepath) #读取已存在的 Excel 文件（.xlsx 格式）
-    else:
-        wb = Workbook() #创建新的空白 Excel 文件
-
-    # 获取/创建工作表
-    if sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-    else:
-        ws = wb.create_sheet(title=sheet_name)
-
-    # 计算下一空列（openpyxl的max_column是1基）
-    # 若完全空表（A1也为空），从第1列写
-    if ws.max_column == 1 and ws.max_row == 1 and ws["A1"].value is None:
-        next_col = 1
-    else:
-        next_col = ws.max_column + 1
-
-    # 写表头（第1行）
-    ws.cell(row=1, column=next_col, value=col_name)
-
-    # 从第2行开始写数据
-    for i, v in enumerate(values, start=2):
-        ws.cell(row=i, column=next_col, value=v)
-
-    wb.save(filepath)
-    wb.close()
-
-def transform_name(name: str):
-    """
-    根据输入名称生成加工后的名称。
-    """
-    if not isinstance(name, str):
-        return None
-
-    parts = name.strip().split('_')
-    if len(parts) < 2:
-        return None
-
-    # 提取前缀中的数字 (如 SLP014 -> 014 -> 14)
-    m = re.match(r'^SLP(\d+)$', parts[0])
-    if not m:
-        return None
-    num_str = m.group(1)
-    num_clean = str(int(num_str))  # 去除前导零
-
-    # 情况一：Day1
-    if parts[1] == 'Day1':
-        return f"{num_clean}_base"
-
-    # 情况二：有第三部分为 up 或 down
-    if len(parts) >= 3 and parts[2] in ('up', 'down'):
-        return f"{num_clean}_{parts[2]}"
-
-    return None
-
-
-def header_exists_pd(filepath: str, col_name: str, sheet_name: str = "Sheet1") -> bool:
-    """
-    使用 pandas 检查 Excel 指定工作表第一行表头是否包含 col_name。
-    """
-    fp = Path(filepath)
-    if not fp.is_file():
-        return False
-
-    try:
-        # nrows=0 只读取表头 (列名)，不会加载数据内容
-        df = pd.read_excel(fp, sheet_name=sheet_name, nrows=0, engine="openpyxl")
-    except Exception:
-        return False
+import os
+import time
 
-    # df.columns 就是表头列表
-    return str(col_name) in [str(c) for c in df.columns]
+from batch_runner import run_tasks
+from hrv_core import (WAVE_SHEETS, load_dict_from_json, process_subject, process_wave, resolve_eeg_mat_path,
+                      transform_name)
+from profiling import stage, set_quiet, print_report, save_report
+from result_store import append_result, has_result, import_excel, export_excel
+from run_ledger import RunLedger, source_signature, unit_params_hash
 
 
 # ------------------------------------加载数据-------------------------------------------------------------------
 # 加载字典
 sampling_rate = 1000
 pairs_dictionary = 'D:\\JetBrains\PyCharm Community Edition 2019.2.4\\project\\SleepPic\\HRV_SleepStage(Zhangsong)\\Stimulated_heartRate_calculation\\pairs_path_2.json'
-loaded_dictionary = load_dict_from_json(pairs_dictionary)
 # mat源文件路径'E:\\Auditory Sleep Stimulation Data\\MAT_original_filter\\EEG_data'
 mat_sourceFolder = 'E:\\Auditory Sleep Stimulation Data\\MAT_original_filter\\EEG_data'
-for key_subID, value_pairs in loaded_dictionary.items():
-
-    #print(resolve_eeg_mat_path(key_subID, mat_sourceFolder))
-    # --------------------------------------获取心电数据数据-----------------------------------
-    mat_path = resolve_eeg_mat_path(key_subID, mat_sourceFolder)
-    print(f"正在处理文件为：{mat_path}")
-    if mat_path is None:
-        continue
-
-    excel_SDNN_path = "D:\\研究生\\HR_trend_pro1\\result_R\\SDNN.xlsx"
-    excel_RMSSD_path = "D:\\研究生\\HR_trend_pro1\\result_R\\RMSSD.xlsx"
-
-
-    # 列表头
-    # ----------------------------------判断文件是否需要处理----------------------------------------
-    col_tilte = transform_name(key_subID)
-    isProcess = header_exists_pd(excel_SDNN_path, col_tilte, 'firstWave')
-    if isProcess == True:
-        print("文件夹已经处理过。")
-        continue
-
-    ecg_data = get_ecg(mat_path)
-    # 加载标签（这个有异常情况）
-    if not value_pairs:# SLP019跳过，后续单独处理
-        print(f"{key_subID} 没有任何配对，跳过")
-        continue
-
-    start1, end1 = value_pairs[0]
-    first_slowWave = ecg_data[int(start1):int(end1)]
-
-    # ------------------------------------处理心电，计算R期数量---------------------------------------
-    try:
-        SDNN_1, RMSSD_1 = hrv_sliding_windows(first_slowWave, sampling_rate)
-    except Exception as e:
-        print("处理文件时出错:", e)
-        SDNN_1, RMSSD_1 = None, None
-    # ------------------------------------保存数据----------------------------------------------------
-
-    #append_column_to_excel_no_align(save_file_path, col_tilte, first_result_r_number, 'firstWave')
-    append_column_to_excel_no_align(excel_SDNN_path, col_tilte, SDNN_1, "firstWave")
-    append_column_to_excel_no_align(excel_RMSSD_path, col_tilte, RMSSD_1, "firstWave")
-
-    print('第一个慢波保存成功')
-
-    if len(value_pairs) == 1:
-        continue
-
-    start2, end2 = value_pairs[1]
-    second_slowWave = ecg_data[int(start2):int(end2)]
-    try:
-        SDNN_2, RMSSD_2 = hrv_sliding_windows(second_slowWave, sampling_rate)
-    except Exception as e:
-        print("处理文件时出错:", e)
-        SDNN_2, RMSSD_2 = None, None
+excel_SDNN_path = "D:\\研究生\\HR_trend_pro1\\result_R\\SDNN.xlsx"
+excel_RMSSD_path = "D:\\研究生\\HR_trend_pro1\\result_R\\RMSSD.xlsx"
+result_store_path = "D:\\研究生\\HR_trend_pro1\\result_R\\results.h5"  # 列式结果文件，Excel 由它一次性导出
+# 断点续跑台账：记录已完成的 (列表头, 慢波, 参数哈希)，重启后跳过；检测器、质量筛选、配对区间或源文件变化的单元自动重做
+ledger_path = "D:\\研究生\\HR_trend_pro1\\result_R\\run_ledger.sqlite"
+LEDGER_VERSION = 1  # 计算方法改变（结果需要全部重算）时加 1
+
+# 心电 memmap 缓存目录：None 时写在源文件旁（.ecg.npy/.ecg.json）。批处理只读刺激配对区间，
+# 缓存不存在时直接按区间读取源文件、不做整通道转换；已有缓存（例如 ecg_replay.py 生成的）时从缓存读取
+ecg_cache_dir = None
+
+n_workers = None   # 进程数，None 为 CPU 核数，1 为串行
+per_pair = False   # True 时每个刺激配对单独作为一个任务分发
+# R 峰检测器：'neurokit' 为全采样率检测；'neurokit_250hz' 降采样到 250 Hz 检测后回到 1000 Hz 细化，
+# 速度与 RR 误差见 python bench_detectors.py --fs 1000 --detectors neurokit neurokit_cleaned --decimate 250
+#   --noise 0.02 --powerline 0.02（源数据已滤波，用低噪声合成心电评估）
+rpeak_detector = 'neurokit'
+# True 时信号质量不合格的窗口（电极脱落、削波、体动）SDNN/RMSSD 记为 NaN，各窗口质量评分另存为 QUALITY.xlsx
+quality_gate = False
+excel_QUALITY_path = "D:\\研究生\\HR_trend_pro1\\result_R\\QUALITY.xlsx"
+# 运行报告（各阶段耗时、计数、峰值内存）；quiet=True 时不打印逐窗口结果；profile_dir 不为 None 时按被试保存 cProfile
+report_path = "D:\\研究生\\HR_trend_pro1\\result_R\\run_report.json"
+quiet = False
+profile_dir = None
+
+
+def main(workers=n_workers, split_pairs=per_pair, detector=rpeak_detector, gate=quality_gate,
+         quiet_mode=quiet, profile_to=profile_dir, cache_dir=ecg_cache_dir):
+    t_start = time.perf_counter()
+    set_quiet(quiet_mode)
+    loaded_dictionary = load_dict_from_json(pairs_dictionary)
+
+    # 第一次使用结果文件时，把已有的 Excel 结果导入进来（旧工作表名随之改正，本次结束时重新导出）
+    migrated = not os.path.isfile(result_store_path)
+    if migrated:
+        import_excel(result_store_path, "SDNN", excel_SDNN_path)
+        import_excel(result_store_path, "RMSSD", excel_RMSSD_path)
+
+    # 第一次使用台账时，结果文件中 SDNN、RMSSD 都已有的列视为已按当前参数完成（只此一次读取结果文件索引）
+    ledger = RunLedger(ledger_path)
+    adopt = len(ledger) == 0 and os.path.isfile(result_store_path)
+
+    # ----------------------------------收集需要处理的任务----------------------------------------
+    tasks = {}
+    unit_params = {}    # (列表头, 第几个慢波) -> 参数哈希
+    subject_waves = {}  # 列表头 -> 本次要处理的慢波序号（整被试为一个任务时，结果按此对应）
+    all_titles = []     # 按字典顺序记录，导出时保持列顺序
+    for key_subID, value_pairs in loaded_dictionary.items():
+
+        mat_path = resolve_eeg_mat_path(key_subID, mat_sourceFolder)
+        print(f"正在处理文件为：{mat_path}")
+        if mat_path is None:
+            continue
 
-    #append_column_to_excel_no_align(save_file_path, col_tilte, second_result_r_number, 'secondWave')
-    append_column_to_excel_no_align(excel_SDNN_path, col_tilte, SDNN_2, "secondtWave")
-    append_column_to_excel_no_align(excel_RMSSD_path, col_tilte, RMSSD_2, "secondWave")
-    print('第二个慢波保存成功')
+        # 列表头
+        col_tilte = transform_name(key_subID)
+        all_titles.append(col_tilte)
 
+        # 加载标签（这个有异常情况）
+        if not value_pairs:# SLP019跳过，后续单独处理
+            print(f"{key_subID} 没有任何配对，跳过")
+            continue
 
+        pairs = value_pairs[:len(WAVE_SHEETS)]
+        source = source_signature(mat_path)
+        todo = []
+        for wave_index, pair in enumerate(pairs):
+            params = unit_params_hash(version=LEDGER_VERSION, source=source, pair=list(pair),
+                                      sampling_rate=sampling_rate, detector=detector, gate=gate)
+            if adopt and all(has_result(result_store_path, col_tilte, WAVE_SHEETS[wave_index], metric)
+                             for metric in ("SDNN", "RMSSD")):
+                ledger.mark_done(col_tilte, wave_index, params, adopted=True)
+            if ledger.is_done(col_tilte, wave_index, params):
+                continue
+            unit_params[(col_tilte, wave_index)] = params
+            todo.append(wave_index)
+        if not todo:
+            print("文件夹已经处理过。")
+            continue
 
+        subject_waves[col_tilte] = todo
+        if split_pairs:
+            for wave_index in todo:
+                tasks[(col_tilte, wave_index)] = (mat_path, pairs[wave_index], sampling_rate, detector, gate,
+                                                  profile_to, cache_dir)
+        else:
+            tasks[col_tilte] = (mat_path, [pairs[i] for i in todo], sampling_rate, detector, gate,
+                                profile_to, cache_dir)
+
+    # ------------------------------------逐个保存（每个单元写入结果文件后再记入台账）---------------------------
+    saved = []
+
+    def persist(key, result):
+        if split_pairs:
+            wave_results = {key: result}
+        else:
+            wave_results = dict(zip(((key, w) for w in subject_waves[key]), result or []))
+        with stage('persist') as counts:
+            for (col_tilte, wave_index), wave_result in wave_results.items():
+                sheet_name = WAVE_SHEETS[wave_index]
+                if wave_result is None or wave_result[0] is None:  # 出错的单元不记入台账，下次重做
+                    print(f'{col_tilte} {sheet_name} 处理失败，未保存')
+                    continue
+                SDNN, RMSSD, *QUALITY = wave_result
+                metrics = {"SDNN": SDNN, "RMSSD": RMSSD}
+                if QUALITY:
+                    metrics["QUALITY"] = QUALITY[0]
+                append_result(result_store_path, col_tilte, sheet_name, metrics)
+                ledger.mark_done(col_tilte, wave_index, unit_params[(col_tilte, wave_index)], windows=len(SDNN))
+                saved.append((col_tilte, wave_index))
+                counts['units'] = counts.get('units', 0) + 1
+                print(f'{col_tilte} {sheet_name} 保存成功')
+
+    # ------------------------------------并行处理心电---------------------------------------
+    task_fn = process_wave if split_pairs else process_subject
+    run_tasks(task_fn, tasks, workers, on_result=persist)
+    ledger.close()
+
+    # ------------------------------------导出 Excel（有新结果、刚从旧 Excel 迁移或文件不存在时，各指标一起导出）---------------------------
+    with stage('export'):
+        for metric, excel_path in (("SDNN", excel_SDNN_path), ("RMSSD", excel_RMSSD_path), ("QUALITY", excel_QUALITY_path)):
+            if metric == "QUALITY" and not gate:
+                continue
+            if saved or migrated or not os.path.isfile(excel_path):
+                export_excel(result_store_path, metric, excel_path, columns=all_titles)
+
+    report = save_report(report_path, workers=workers, split_pairs=split_pairs, detector=detector,
+                         tasks=len(tasks), units_saved=len(saved), wall_s=time.perf_counter() - t_start)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
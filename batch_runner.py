@@ -0,0 +1,57 @@
+# function: 多进程批处理，把各被试（或各刺激配对）分发到进程池，结果在主进程汇总
+# author: Zhangsong
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from profiling import call_with_stages, merge_stages
+
+
+def run_tasks(task_fn, tasks, workers=None, on_result=None):
+    """
+    用进程池并行执行相互独立的任务，结果在主进程中按任务键收集。
+    子进程中记录的阶段耗时（profiling.stage）随结果带回，合并到主进程的统计里。
+
+    参数:
+        task_fn : callable  模块顶层函数（需可被子进程导入），task_fn(*args) 返回单个任务结果
+        tasks : dict        {任务键: 参数元组}
+        workers : int | None 进程数，None 时为 CPU 核数，1 时在主进程中串行执行（便于调试）
+        on_result : callable(key, result) | None  每个任务完成后立即在主进程中调用（如逐个保存结果），
+                    之后的任务出错或进程中断不影响已处理的结果
+
+    返回:
+        dict  {任务键: 结果}，出错的任务结果为 None
+    """
+    results = {}
+    if not tasks:
+        return results
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+
+    if workers == 1:
+        for key, args in tasks.items():
+            try:
+                results[key] = task_fn(*args)
+            except Exception as e:
+                print(f"{key} 处理出错: {e}")
+                results[key] = None
+            if on_result is not None:
+                on_result(key, results[key])
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(call_with_stages, task_fn, *args): key for key, args in tasks.items()}
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                results[key], snapshot = future.result()
+                merge_stages(snapshot)
+            except Exception as e:
+                print(f"{key} 处理出错: {e}")
+                results[key] = None
+            if on_result is not None:
+                on_result(key, results[key])
+            print(f"[{n_done}/{len(tasks)}] {key} 完成")
+    return results
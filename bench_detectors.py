@@ -0,0 +1,178 @@
+# function: R 峰检测器对比：各检测后端的速度（峰/秒、实时倍数）与准确性（灵敏度、阳性预测值、定位误差）
+# author: Zhangsong
+
+# 用法:
+#   合成心电:  python bench_detectors.py --fs 250 1000 --minutes 10
+#   降采样:    python bench_detectors.py --fs 1000 --detectors neurokit_cleaned --decimate 500 250 125
+#   低噪声:    python bench_detectors.py --fs 1000 --detectors neurokit neurokit_cleaned --decimate 250 --noise 0.02 --powerline 0.02
+#             （模拟已滤波的批处理数据；默认噪声下未清洗的 neurokit 在 1000 Hz 检测不到 R 峰，降采样对比没有参考）
+#   真实数据:  python bench_detectors.py --record SLP012_Day2.edf --reference ref_peaks.txt --start 3600 --duration 600
+# 参考标注为每行一个 R 峰采样点索引（相对整条记录）的文本文件或 .npy。
+# 合成数据用 synthetic_ecg.simulate_ecg 生成，参考标注是合成时的真实 R 峰位置（不依赖任何被测检测器），
+# 信号含白噪声、工频干扰、基线漂移（幅度由 --noise / --powerline / --baseline 设定）和少量室性早搏。
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from rpeak_detect import DETECTORS, detect_rpeaks_decimated, get_detector, match_rpeaks, rr_error_report
+from synthetic_ecg import simulate_ecg
+
+
+def synthetic_case(fs, minutes, seed=0, noise=0.05, powerline=0.1, baseline=0.3):
+    """
+    合成心电及其真实 R 峰，noise / powerline / baseline 为白噪声、工频干扰、基线漂移的幅度 (mV)。
+
+    返回:
+        noisy : ndarray      含噪声、工频干扰和基线漂移的心电
+        reference : ndarray  合成时的 R 峰索引（真值）
+    """
+    noisy, reference, _ = simulate_ecg(minutes * 60, fs, heart_rate=65, hrv_std_ms=50, ectopic_fraction=0.005,
+                                       noise=noise, powerline=powerline, baseline=baseline, seed=seed)
+    return noisy, reference
+
+
+def record_case(record_path, reference_path, start_seconds, duration_seconds):
+    """
+    真实记录中的一段心电及该段内的参考 R 峰（索引换算为相对本段）。
+    """
+    from ecg_io import open_ecg_cache
+    ecg_data, fs = open_ecg_cache(record_path)
+    start = int(start_seconds * fs)
+    end = len(ecg_data) if duration_seconds is None else min(len(ecg_data), start + int(duration_seconds * fs))
+    if reference_path.endswith('.npy'):
+        reference = np.load(reference_path)
+    else:
+        reference = np.loadtxt(reference_path, dtype=np.int64, ndmin=1)
+    reference = np.sort(reference[(reference >= start) & (reference < end)]) - start
+    return np.asarray(ecg_data[start:end], dtype=np.float64), reference, fs
+
+
+def warm_up(detect_fn, ecg_data, fs, seconds=10):
+    """
+    先在一小段数据上运行一次，使检测器的惰性导入（neurokit2 等）不计入耗时。
+    """
+    try:
+        detect_fn(ecg_data[:int(seconds * fs)], fs)
+    except Exception:  # 片段太短等问题留到正式运行时再报告
+        pass
+
+
+def bench_detector(name, ecg_data, fs, reference, repeats=1):
+    """
+    运行一个检测器并评分，耗时取 repeats 次中的最小值。
+    """
+    detect_fn = get_detector(name)
+    warm_up(detect_fn, ecg_data, fs)
+    elapsed = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        peaks = detect_fn(ecg_data, fs)
+        elapsed = min(elapsed, time.perf_counter() - t0)
+    result = match_rpeaks(peaks, reference, fs)
+    result.update({
+        'detector': name,
+        'fs': fs,
+        'seconds': elapsed,
+        'peaks_per_s': len(peaks) / elapsed if elapsed > 0 else np.inf,
+        'realtime_factor': len(ecg_data) / fs / elapsed if elapsed > 0 else np.inf,
+    })
+    return result
+
+
+def bench_decimation(name, ecg_data, fs, target_rate, repeats=1, smooth_seconds=None):
+    """
+    同一检测器在全采样率与降采样到 target_rate 后的耗时对比，以及降采样引入的 RR 误差（以全采样率结果为参考）。
+    全采样率检测到的 R 峰少于 2 个时无法作为参考，抛出 ValueError。
+    """
+    detect_fn = get_detector(name)
+    warm_up(detect_fn, ecg_data, fs)
+
+    def timed(fn):
+        elapsed = np.inf
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            peaks = fn()
+            elapsed = min(elapsed, time.perf_counter() - t0)
+        return peaks, elapsed
+
+    full, t_full = timed(lambda: detect_fn(ecg_data, fs))
+    if len(full) < 2:
+        raise ValueError(f"{name} 在全采样率 {fs:g} Hz 下只检测到 {len(full)} 个 R 峰，不能作为降采样的参考"
+                         f"（可换用 neurokit_cleaned 或降低 --noise / --powerline）")
+    fast, t_fast = timed(lambda: detect_rpeaks_decimated(ecg_data, fs, target_rate, detect_fn,
+                                                            smooth_seconds=smooth_seconds))
+    result = rr_error_report(full, fast, fs)
+    result.update({'detector': name, 'fs': fs, 'target_rate': target_rate,
+                   'seconds_full': t_full, 'seconds_decimated': t_fast, 'speedup': t_full / t_fast})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="R 峰检测器速度与准确性对比")
+    parser.add_argument('--detectors', nargs='*', default=None, help=f"默认全部: {sorted(DETECTORS)}")
+    parser.add_argument('--fs', nargs='*', type=float, default=[250, 500, 1000], help="合成心电的采样率")
+    parser.add_argument('--minutes', type=float, default=10, help="合成心电时长（分钟）")
+    parser.add_argument('--noise', type=float, default=0.05, help="合成心电白噪声标准差 (mV)")
+    parser.add_argument('--powerline', type=float, default=0.1, help="合成心电工频干扰幅度 (mV)")
+    parser.add_argument('--baseline', type=float, default=0.3, help="合成心电基线漂移幅度 (mV)")
+    parser.add_argument('--record', default=None, help=".mat / .edf 记录（需同时给出 --reference）")
+    parser.add_argument('--reference', default=None, help="参考 R 峰索引文件")
+    parser.add_argument('--start', type=float, default=0.0, help="记录中的起始时刻（秒）")
+    parser.add_argument('--duration', type=float, default=600.0, help="记录中截取的时长（秒）")
+    parser.add_argument('--decimate', nargs='*', type=float, default=None,
+                        help="改为对比降采样检测：降采样到这些采样率后检测，报告加速比和 RR 误差")
+    parser.add_argument('--refine-smooth', type=float, default=None,
+                        help="降采样检测细化前的滑动平均宽度（秒），如 0.02")
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--json', default=None, help="结果保存为 JSON")
+    args = parser.parse_args()
+
+    names = args.detectors or sorted(DETECTORS)
+    if args.record:
+        if not args.reference:
+            parser.error("--record 需要同时给出 --reference")
+        ecg_data, reference, fs = record_case(args.record, args.reference, args.start, args.duration)
+        cases = [(fs, ecg_data, reference)]
+    else:
+        cases = [(fs, *synthetic_case(fs, args.minutes, noise=args.noise, powerline=args.powerline,
+                                      baseline=args.baseline)) for fs in args.fs]
+
+    results = []
+    if args.decimate:
+        print(f"{'fs':>6} {'检测器':<20} {'降至':>6} {'全速(s)':>8} {'降采样(s)':>9} {'加速比':>6} "
+              f"{'灵敏度':>7} {'PPV':>7} {'RR平均误差':>10} {'RR最大误差':>10}")
+        for fs, ecg_data, _ in cases:
+            for name in names:
+                for target_rate in args.decimate:
+                    r = bench_decimation(name, ecg_data, fs, target_rate, args.repeats, args.refine_smooth)
+                    results.append(r)
+                    print(f"{fs:>6g} {name:<20} {target_rate:>6g} {r['seconds_full']:>8.3f} "
+                          f"{r['seconds_decimated']:>9.3f} {r['speedup']:>6.1f} {r['sensitivity']:>7.3f} "
+                          f"{r['ppv']:>7.3f} {r.get('rr_mae_ms', np.nan):>10.3f} {r.get('rr_max_error_ms', np.nan):>10.3f}")
+        names = []
+
+    if names:
+        print(f"{'fs':>6} {'检测器':<26} {'耗时(s)':>8} {'峰/秒':>10} {'实时倍数':>9} "
+              f"{'灵敏度':>7} {'PPV':>7} {'误差(ms)':>8}")
+    for fs, ecg_data, reference in cases:
+        for name in names:
+            try:
+                r = bench_detector(name, ecg_data, fs, reference, args.repeats)
+            except Exception as e:  # 某个后端缺少依赖或在该数据上出错，不影响其他后端
+                print(f"{fs:>6g} {name:<26} 出错: {e}")
+                continue
+            results.append(r)
+            print(f"{fs:>6g} {name:<26} {r['seconds']:>8.3f} {r['peaks_per_s']:>10.0f} "
+                  f"{r['realtime_factor']:>9.0f} {r['sensitivity']:>7.3f} {r['ppv']:>7.3f} "
+                  f"{r['mean_abs_error_ms']:>8.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
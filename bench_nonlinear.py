@@ -0,0 +1,109 @@
+# function: 非线性 HRV 的性能对比：KD 树 / 累加和实现 vs 逐对比较、逐箱 polyfit 的暴力实现，
+#           输出不同 RR 长度下的耗时和结果差异，以及整晚滑窗批量计算的耗时
+# author: Zhangsong
+
+import time
+
+import numpy as np
+
+from hrv_nonlinear import (sample_entropy, approximate_entropy, dfa_alpha, window_nonlinear,
+                           DFA_SHORT_SCALES, DFA_LONG_SCALES)
+
+
+def sample_entropy_brute(x, emb_dim=2, tolerance=None):
+    """
+    逐对比较的样本熵（与 nolds.sampen 相同的循环），O(N²)。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if tolerance is None:
+        tolerance = 0.2 * np.std(x)
+    counts = []
+    for m in (emb_dim, emb_dim + 1):
+        templates = np.array([x[i:i + m] for i in range(n - emb_dim)])
+        count = 0
+        for i in range(len(templates) - 1):
+            count += np.sum(np.max(np.abs(templates[i + 1:] - templates[i]), axis=1) < tolerance)
+        counts.append(count)
+    return -np.log(counts[1] / counts[0])
+
+
+def approximate_entropy_brute(x, emb_dim=2, tolerance=None):
+    """
+    逐对比较的近似熵，O(N²)。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if tolerance is None:
+        tolerance = 0.2 * np.std(x)
+    phi = []
+    for m in (emb_dim, emb_dim + 1):
+        templates = np.array([x[i:i + m] for i in range(len(x) - m + 1)])
+        c = [np.mean(np.max(np.abs(templates - t), axis=1) <= tolerance) for t in templates]
+        phi.append(np.mean(np.log(c)))
+    return phi[0] - phi[1]
+
+
+def dfa_alpha_brute(x, scales):
+    """
+    逐箱 np.polyfit 去趋势的 DFA。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    profile = np.cumsum(x - x.mean())
+    scales = [s for s in scales if len(profile) // s >= 2]
+    fluct = []
+    for s in scales:
+        k = np.arange(s)
+        res = []
+        for b in range(len(profile) // s):
+            y = profile[b * s:(b + 1) * s]
+            fit = np.polyval(np.polyfit(k, y, 1), k)
+            res.append(np.mean((y - fit) ** 2))
+        fluct.append(np.sqrt(np.mean(res)))
+    return np.polyfit(np.log(scales), np.log(fluct), 1)[0]
+
+
+def synthetic_rr(n, seed=0):
+    """
+    生成带慢漂移和逐搏噪声的 RR 间期 (ms)。
+    """
+    rng = np.random.default_rng(seed)
+    return 850 + np.cumsum(rng.normal(0, 4, n)) * 0.3 + rng.normal(0, 35, n)
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - t0
+
+
+def main():
+    print(f"{'N':>6} {'指标':>10} {'快速(s)':>10} {'暴力(s)':>10} {'加速比':>8} {'差异':>10}")
+    for n in (250, 500, 1000, 2000, 4000):
+        rr = synthetic_rr(n)
+        cases = [
+            ('sampen', sample_entropy, sample_entropy_brute, (rr,)),
+            ('apen', approximate_entropy, approximate_entropy_brute, (rr,)),
+            ('dfa_a1', dfa_alpha, dfa_alpha_brute, (rr, DFA_SHORT_SCALES)),
+            ('dfa_a2', dfa_alpha, dfa_alpha_brute, (rr, DFA_LONG_SCALES)),
+        ]
+        for name, fast, brute, args in cases:
+            v_fast, t_fast = timed(fast, *args)
+            v_brute, t_brute = timed(brute, *args)
+            print(f"{n:>6} {name:>10} {t_fast:>10.4f} {t_brute:>10.4f} {t_brute / t_fast:>8.1f} "
+                  f"{abs(v_fast - v_brute):>10.2e}")
+
+    # 整晚（约 8 小时、3.2 万个心搏）5 分钟窗、30 秒步长
+    rr = synthetic_rr(32000, seed=1)
+    beat_times = np.cumsum(rr) / 1000
+    starts = np.arange(0, beat_times[-1] - 300, 30)
+    lo = np.searchsorted(beat_times, starts)
+    hi = np.searchsorted(beat_times, starts + 300)
+    tolerance = 0.2 * np.std(rr)
+    for label, kwargs in (('逐窗容差', {}), ('固定容差(共享匹配对)', {'tolerance': tolerance})):
+        _, t_sampen = timed(window_nonlinear, rr, lo, hi, apen=False, dfa=False, **kwargs)
+        _, t_all = timed(window_nonlinear, rr, lo, hi, **kwargs)
+        print(f"整晚 {len(lo)} 个窗口 {label}: 仅样本熵 {t_sampen:.2f} s，全部特征 {t_all:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# function: HRV 滑窗流程的性能基准：用可复现的合成心电（1 分钟到 10 小时，250/500/1000 Hz）逐阶段计时，
+#           结果保存为 JSON，并与基线 JSON 对比，任一阶段变慢超过设定百分比时以非零状态退出
+# author: Zhangsong
+
+# 用法:
+#   生成基线:  python bench_pipeline.py --json bench_baseline.json
+#   对比基线:  python bench_pipeline.py --json bench_new.json --baseline bench_baseline.json --tolerance 20
+#   快速检查:  python bench_pipeline.py --minutes 1 10 --fs 250 1000 --baseline bench_baseline.json
+# 阶段: detect（整段 R 峰检测）、quality（信号质量）、clean（RR 清理）、features（时域，auto_sdnn_rmssd_demo 的路径），
+#       frequency / poincare / nonlinear（demo1.py 的批量特征）。耗时取 repeats 次中的最小值。
+# 只有两次结果中都存在的 (用例, 阶段) 才参与对比；耗时差小于 --min-delta 秒的不算退化（避免短阶段的计时抖动）。
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from hrv_core import hrv_sliding_windows
+from hrv_features import window_frequency_domain, window_poincare, peak_to_rr_ranges
+from hrv_nonlinear import window_nonlinear
+from hrv_windows import window_bounds, window_peak_ranges
+from profiling import peak_rss_mb, reset_stages, set_quiet, stage, stage_report
+from rpeak_detect import get_detector, match_rpeaks
+from synthetic_ecg import simulate_ecg
+
+
+def case_name(fs, minutes):
+    return f"{fs:g}Hz_{minutes:g}min"
+
+
+def run_pipeline(ecg_data, fs, detector='neurokit', window_minutes=5, step_seconds=30):
+    """
+    按生产流程跑一遍并逐阶段计时，返回 (各阶段统计, R 峰)。
+    """
+    reset_stages()
+    with stage('detect', samples=len(ecg_data)) as counts:
+        rpeaks = get_detector(detector)(ecg_data, fs)
+        counts['beats'] = len(rpeaks)
+    hrv_sliding_windows(ecg_data, fs, window_minutes, step_seconds, rpeaks=rpeaks, clean_rr=True, quality_gate=True)
+
+    starts, ends = window_bounds(len(ecg_data), fs, window_minutes, step_seconds)
+    lo, hi = window_peak_ranges(rpeaks, starts, ends)
+    rr_ms = np.diff(rpeaks) / fs * 1000
+    rr_lo, rr_hi = peak_to_rr_ranges(lo, hi)
+    with stage('frequency', windows=len(starts)):
+        window_frequency_domain(rpeaks, fs, starts, ends)
+    with stage('poincare', windows=len(starts), beats=len(rr_ms)):
+        window_poincare(rr_ms, rr_lo, rr_hi)
+    with stage('nonlinear', windows=len(starts), beats=len(rr_ms)):
+        window_nonlinear(rr_ms, rr_lo, rr_hi)
+    return stage_report()['stages'], rpeaks
+
+
+def bench_case(fs, minutes, args):
+    """
+    一个 (采样率, 时长) 用例：合成心电，跑 repeats 次，各阶段取最短耗时，并用真值 R 峰评估检测准确性。
+    """
+    t0 = time.perf_counter()
+    ecg_data, truth, _ = simulate_ecg(minutes * 60, fs, heart_rate=args.heart_rate, hrv_std_ms=args.hrv,
+                                      ectopic_fraction=args.ectopic, noise=args.noise, seed=args.seed)
+    synth_s = time.perf_counter() - t0
+
+    best = {}
+    for _ in range(args.repeats):
+        stages, rpeaks = run_pipeline(ecg_data, fs, args.detector, args.window_minutes, args.step)
+        for name, record in stages.items():
+            if name not in best or record['wall_s'] < best[name]['wall_s']:
+                best[name] = record
+    accuracy = match_rpeaks(rpeaks, truth, fs)
+    return {'fs': fs, 'minutes': minutes, 'samples': len(ecg_data), 'beats': len(truth),
+            'synthesize_s': synth_s, 'stages': best,
+            'total_s': sum(record['wall_s'] for record in best.values()),
+            'sensitivity': accuracy['sensitivity'], 'ppv': accuracy['ppv'],
+            'peak_rss_mb': peak_rss_mb()}  # 进程累计峰值，用例按时长从小到大排列时约等于本用例的峰值
+
+
+def compare_results(current, baseline, tolerance_percent=20.0, min_delta_s=0.05):
+    """
+    逐 (用例, 阶段) 对比墙钟耗时。
+
+    返回:
+        list[dict]  变慢超过 tolerance_percent 且绝对差超过 min_delta_s 的阶段
+    """
+    regressions = []
+    for name, case in current['cases'].items():
+        base_case = baseline.get('cases', {}).get(name)
+        if base_case is None:
+            continue
+        for stage_name, record in case['stages'].items():
+            base = base_case['stages'].get(stage_name)
+            if base is None:
+                continue
+            new_s, old_s = record['wall_s'], base['wall_s']
+            if new_s - old_s > min_delta_s and new_s > old_s * (1 + tolerance_percent / 100):
+                regressions.append({'case': name, 'stage': stage_name, 'baseline_s': old_s, 'current_s': new_s,
+                                    'slowdown_percent': (new_s / old_s - 1) * 100 if old_s > 0 else np.inf})
+    return regressions
+
+
+def environment_info():
+    import neurokit2 as nk
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'neurokit2': nk.__version__,
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpu_count': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HRV 滑窗流程性能基准（合成心电）")
+    parser.add_argument('--minutes', nargs='*', type=float, default=[1, 10, 60, 600], help="合成心电时长（分钟）")
+    parser.add_argument('--fs', nargs='*', type=float, default=[250, 500, 1000], help="采样率")
+    parser.add_argument('--heart-rate', type=float, default=65.0, help="平均心率 (bpm)")
+    parser.add_argument('--hrv', type=float, default=50.0, help="窦性 RR 标准差 (ms)")
+    parser.add_argument('--noise', type=float, default=0.02, help="白噪声标准差 (mV)")
+    parser.add_argument('--ectopic', type=float, default=0.005, help="早搏比例")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--detector', default='neurokit', help="R 峰检测器（见 rpeak_detect.DETECTORS）")
+    parser.add_argument('--window-minutes', type=float, default=5)
+    parser.add_argument('--step', type=float, default=30, help="窗口步长（秒）")
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--json', default=None, help="结果保存为 JSON（可作为以后的基线）")
+    parser.add_argument('--baseline', default=None, help="基线 JSON，与之对比")
+    parser.add_argument('--tolerance', type=float, default=20.0, help="允许的变慢百分比")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="小于该秒数的耗时差不算退化")
+    args = parser.parse_args()
+
+    set_quiet(True)
+    results = {'environment': environment_info(), 'settings': vars(args), 'cases': {}}
+    print(f"{'用例':<16} {'样本数':>10} {'合成(s)':>8} {'总计(s)':>8} {'灵敏度':>7}  各阶段(s)")
+    for fs in args.fs:
+        for minutes in args.minutes:
+            case = bench_case(fs, minutes, args)
+            name = case_name(fs, minutes)
+            results['cases'][name] = case
+            timings = ' '.join(f"{k}={v['wall_s']:.3f}" for k, v in case['stages'].items())
+            print(f"{name:<16} {case['samples']:>10} {case['synthesize_s']:>8.2f} {case['total_s']:>8.2f} "
+                  f"{case['sensitivity']:>7.3f}  {timings}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"性能退化（超过 {args.tolerance:g}%）:")
+            for r in regressions:
+                print(f"  {r['case']:<16} {r['stage']:<10} {r['baseline_s']:.3f}s -> {r['current_s']:.3f}s "
+                      f"(+{r['slowdown_percent']:.0f}%)")
+            sys.exit(1)
+        print(f"与基线相比无阶段变慢超过 {args.tolerance:g}%")
+
+
+if __name__ == "__main__":
+    main()
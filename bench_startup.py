@@ -0,0 +1,77 @@
+# function: 冷启动计时：在全新的解释器进程中导入各模块，记录导入耗时以及被连带导入的重型依赖，
+#           超过预算时以非零状态退出（检查库模块是否又在顶层导入了 neurokit2 / hrvanalysis / pandas 等）
+# author: Zhangsong
+
+# 用法:
+#   python bench_startup.py
+#   python bench_startup.py --modules hrv_core auto_sdnn_rmssd_demo --repeats 5 --budget 0.5
+# 耗时为 import 语句本身（不含解释器启动），取 repeats 次中的最小值；第一次运行还包含磁盘冷缓存的影响。
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# 导入超过约 0.1 s 的依赖，库模块和脚本的导入阶段都不应出现
+HEAVY_MODULES = ('neurokit2', 'hrvanalysis', 'mne', 'pandas', 'matplotlib', 'plotly', 'scipy.signal',
+                 'scipy.spatial', 'openpyxl', 'ecgdetectors', 'IPython', 'ipywidgets')
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))  # 子进程在仓库目录下导入，与当前工作目录无关
+DEFAULT_MODULES = ('hrv_core', 'rpeak_detect', 'ecg_io', 'peak_cache', 'hrv_features', 'hrv_nonlinear',
+                   'result_store', 'signal_quality', 'auto_sdnn_rmssd_demo', 'demo1', 'make_cohort', 'ecg_replay')
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t0
+print(json.dumps({{'seconds': seconds, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module, repeats=3):
+    """
+    在 repeats 个新进程中分别导入 module，返回 {'seconds': 最短耗时, 'heavy': 被导入的重型依赖}。
+    """
+    best = None
+    for _ in range(repeats):
+        code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=REPO_DIR)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各模块的冷启动导入耗时")
+    parser.add_argument('--modules', nargs='*', default=list(DEFAULT_MODULES))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--budget', type=float, default=None, help="单个模块导入耗时上限（秒）")
+    parser.add_argument('--json', default=None, help="结果保存为 JSON")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'模块':<24} {'导入(s)':>8}  连带导入的重型依赖")
+    for module in args.modules:
+        try:
+            results[module] = measure_import(module, args.repeats)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<24} 导入失败: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+            continue
+        r = results[module]
+        print(f"{module:<24} {r['seconds']:>8.3f}  {', '.join(r['heavy']) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.budget is not None:
+        slow = [m for m, r in results.items() if r['seconds'] > args.budget]
+        if slow:
+            print(f"超过预算 {args.budget:g} s: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# function: 心电数据读取（只读心电通道、只读需要的采样区间）
+# author: Zhangsong
+
+import json
+import os
+
+import h5py
+import numpy as np
+
+from ecg_filter import design_bandpass_sos, filtfilt_chunked
+
+MAT_DATASET = 'Totol_data'   # .mat(HDF5) 中保存全部通道的矩阵
+MAT_ECG_CHANNEL = 6          # 心电在第7列(索引6)
+MAT_SAMPLING_RATE = 1000     # .mat 中没有保存采样率，实验采样率为 1000 Hz
+EDF_ECG_CHANNEL = 'ECG'      # EDF 中心电通道名
+BLOCK_ROWS = 1 << 20         # 无分块数据集时每次读取的行数（约 100 万个采样点）
+
+
+def _block_rows(dataset):
+    """
+    按数据集的分块大小确定每次读取的行数，保证每次读取都落在完整的块上。
+    """
+    if dataset.chunks is None:
+        return BLOCK_ROWS
+    chunk_rows = dataset.chunks[0]
+    return max(chunk_rows, (BLOCK_ROWS // chunk_rows) * chunk_rows)
+
+
+def _read_column(dataset, channel, start, end, out=None):
+    """
+    按块读取 dataset[start:end, channel]，直接写入预先分配的一维数组（或传入的 out，如 memmap）。
+    """
+    n_rows = dataset.shape[0]
+    start = max(int(start), 0)
+    end = min(int(end), n_rows)
+    if out is None:
+        out = np.empty(max(end - start, 0), dtype=dataset.dtype)
+
+    block = _block_rows(dataset)
+    pos = start
+    while pos < end:
+        stop = min((pos // block + 1) * block, end)  # 对齐到下一个块边界
+        dataset.read_direct(out, np.s_[pos:stop, channel], np.s_[pos - start:stop - start])
+        pos = stop
+    return out
+
+
+def read_mat_channel(mat_path, channel=MAT_ECG_CHANNEL, ranges=None, dataset_name=MAT_DATASET):
+    """
+    从 HDF5 格式的 .mat 文件中只读取一个通道，可选只读取若干采样区间。
+
+    参数:
+        mat_path : str        .mat 文件路径（HDF5 格式）
+        channel : int         通道列索引，默认心电列 6
+        ranges : list | None  [(start, end), ...] 采样点区间（end 不包含），为 None 时读整列
+        dataset_name : str    数据集名称，默认 'Totol_data'
+
+    返回:
+        ranges 为 None 时返回整列 ndarray；否则返回与 ranges 一一对应的 ndarray 列表
+    """
+    with h5py.File(mat_path, 'r') as f:
+        dataset = f[dataset_name]
+        if ranges is None:
+            return _read_column(dataset, channel, 0, dataset.shape[0])
+        return [_read_column(dataset, channel, start, end) for start, end in ranges]
+
+
+
+_edf_cache = {}  # (绝对路径, 通道名) -> [raw, 整条通道数据或 None]
+
+
+def _open_edf(edf_path, channel):
+    """
+    惰性打开 EDF，只保留一个通道（不 preload）。同一进程内重复调用直接复用。
+    """
+    key = (os.path.abspath(edf_path), channel)
+    if key not in _edf_cache:
+        import mne  # 只读 .mat 或缓存时不需要 mne
+        raw = mne.io.read_raw_edf(edf_path, include=[channel], preload=False, verbose='ERROR')
+        _edf_cache[key] = [raw, None]
+    return _edf_cache[key]
+
+
+def read_edf_ecg(edf_path, start=0, stop=None, channel=EDF_ECG_CHANNEL, use_cache=False, cache_dir=None):
+    """
+    从 EDF 文件中只读取心电通道，可选只读取 [start, stop) 采样区间。
+    整条通道读过一次后会缓存，之后同一进程内的任意区间读取都直接切片。
+
+    参数:
+        edf_path : str      EDF 文件路径
+        start : int         起始采样点
+        stop : int | None   结束采样点（不包含），为 None 时读到末尾
+        channel : str       通道名，默认 'ECG'
+        use_cache : bool    是否使用磁盘上的 memmap 心电缓存（见 open_ecg_cache），仅对心电通道有效
+        cache_dir : str | None  缓存目录，为 None 时与源文件同目录
+
+    返回:
+        ecg_data, sampling_rate
+    """
+    if use_cache and channel == EDF_ECG_CHANNEL:
+        ecg_data, sampling_rate = open_ecg_cache(edf_path, cache_dir)
+        return ecg_data[start:stop], sampling_rate
+
+    entry = _open_edf(edf_path, channel)
+    raw, ecg_data = entry
+    sampling_rate = raw.info['sfreq']
+
+    if ecg_data is None and start == 0 and stop is None:
+        ecg_data = entry[1] = raw.get_data(picks=[channel])[0]
+
+    if ecg_data is not None:
+        return ecg_data[start:stop], sampling_rate
+    return raw.get_data(picks=[channel], start=int(start), stop=stop)[0], sampling_rate
+
+
+# ------------------------------------心电缓存（memmap）-------------------------------------------------------
+def _cache_paths(source_path, cache_dir=None, tag=''):
+    """
+    缓存文件路径：<cache_dir>/<源文件名>.ecg<tag>.npy 和同名 .json 元数据。cache_dir 为 None 时与源文件同目录。
+    tag 区分同一源文件的不同缓存（例如滤波参数）。
+    """
+    source_path = os.path.abspath(source_path)
+    folder = cache_dir if cache_dir is not None else os.path.dirname(source_path)
+    base = os.path.join(folder, os.path.basename(source_path) + '.ecg' + tag)
+    return base + '.npy', base + '.json'
+
+
+def _cache_is_fresh(source_path, npy_path, meta_path):
+    """
+    元数据中记录的源文件路径、修改时间和大小都与当前源文件一致时，缓存有效。
+    """
+    if not (os.path.isfile(npy_path) and os.path.isfile(meta_path)):
+        return False
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    stat = os.stat(source_path)
+    return (meta.get('source_path') == os.path.abspath(source_path)
+            and meta.get('source_mtime') == stat.st_mtime
+            and meta.get('source_size') == stat.st_size)
+
+
+def ecg_cache_exists(source_path, cache_dir=None):
+    """
+    心电缓存已生成且与当前源文件一致时返回 True（不会生成缓存）。
+    """
+    return _cache_is_fresh(source_path, *_cache_paths(source_path, cache_dir))
+
+
+def build_ecg_cache(source_path, cache_dir=None):
+    """
+    一次性把 .mat(HDF5) 或 .edf 的心电通道转换为可 memmap 的 .npy 文件，并写元数据。
+    先写临时文件再替换，中途失败不会留下半成品缓存。
+
+    参数:
+        source_path : str       .mat 或 .edf 源文件路径
+        cache_dir : str | None  缓存目录，为 None 时与源文件同目录
+
+    返回:
+        str  缓存 .npy 文件路径
+    """
+    source_path = os.path.abspath(source_path)
+    npy_path, meta_path = _cache_paths(source_path, cache_dir)
+    os.makedirs(os.path.dirname(npy_path), exist_ok=True)
+    stat = os.stat(source_path)
+    tmp_path = f'{npy_path}.{os.getpid()}.tmp'  # 多进程同时生成时互不覆盖
+
+    if source_path.lower().endswith('.mat'):
+        sampling_rate = MAT_SAMPLING_RATE
+        with h5py.File(source_path, 'r') as f:
+            dataset = f[MAT_DATASET]
+            out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dataset.dtype,
+                                            shape=(dataset.shape[0],))
+            _read_column(dataset, MAT_ECG_CHANNEL, 0, dataset.shape[0], out=out)
+            out.flush()
+            del out
+    elif source_path.lower().endswith('.edf'):
+        ecg_data, sampling_rate = read_edf_ecg(source_path)
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=ecg_data.dtype,
+                                        shape=ecg_data.shape)
+        out[:] = ecg_data
+        out.flush()
+        del out
+    else:
+        raise ValueError(f"不支持的文件类型: {source_path}")
+
+    os.replace(tmp_path, npy_path)
+    meta = {
+        'sampling_rate': float(sampling_rate),
+        'source_path': source_path,
+        'source_mtime': stat.st_mtime,
+        'source_size': stat.st_size,
+    }
+    tmp_meta_path = f'{meta_path}.{os.getpid()}.tmp'
+    with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_meta_path, meta_path)
+    return npy_path
+
+
+def open_ecg_cache(source_path, cache_dir=None):
+    """
+    以只读 memmap 方式打开心电缓存（零拷贝），缓存不存在或源文件已变化时先重建。
+
+    参数:
+        source_path : str       .mat 或 .edf 源文件路径
+        cache_dir : str | None  缓存目录，为 None 时与源文件同目录
+
+    返回:
+        ecg_data (只读 memmap), sampling_rate
+    """
+    npy_path, meta_path = _cache_paths(source_path, cache_dir)
+    if not _cache_is_fresh(source_path, npy_path, meta_path):
+        print(f"正在生成心电缓存：{npy_path}")
+        build_ecg_cache(source_path, cache_dir)
+
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return np.load(npy_path, mmap_mode='r'), meta['sampling_rate']
+
+
+def open_filtered_ecg(source_path, lowcut=0.3, highcut=70, order=4, cache_dir=None):
+    """
+    整段心电按实际采样率带通滤波一次（分块零相位），结果缓存为 .npy，以只读 memmap 返回。
+    之后任意窗口都只是对滤波结果的切片，不再逐窗滤波。
+
+    参数:
+        source_path : str       .mat 或 .edf 源文件路径
+        lowcut, highcut : float 带通截止频率 (Hz)
+        order : int             滤波器阶数
+        cache_dir : str | None  缓存目录，为 None 时与源文件同目录
+
+    返回:
+        filtered (只读 memmap), sampling_rate
+    """
+    tag = f'.bp{lowcut:g}-{highcut:g}o{order}'
+    npy_path, meta_path = _cache_paths(source_path, cache_dir, tag)
+    if not _cache_is_fresh(source_path, npy_path, meta_path):
+        ecg_data, sampling_rate = open_ecg_cache(source_path, cache_dir)
+        print(f"正在生成滤波心电缓存：{npy_path}")
+        sos = design_bandpass_sos(lowcut, highcut, sampling_rate, order)
+        stat = os.stat(source_path)
+        tmp_path = f'{npy_path}.{os.getpid()}.tmp'
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(len(ecg_data),))
+        filtfilt_chunked(ecg_data, sos, sampling_rate, out=out)
+        out.flush()
+        del out
+        os.replace(tmp_path, npy_path)
+
+        meta = {
+            'sampling_rate': float(sampling_rate),
+            'source_path': os.path.abspath(source_path),
+            'source_mtime': stat.st_mtime,
+            'source_size': stat.st_size,
+            'bandpass': [lowcut, highcut, order],
+        }
+        tmp_meta_path = f'{meta_path}.{os.getpid()}.tmp'
+        with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_meta_path, meta_path)
+
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return np.load(npy_path, mmap_mode='r'), meta['sampling_rate']
@@ -0,0 +1,273 @@
+# function: 本地心电回放服务：按 1×、N× 或最快速度通过 socket 回放 .mat(Totol_data) / EDF 的心电通道，
+#           并在对应时刻插入 points_mark.txt 中的 12/15 标签；附带客户端测试程序，统计端到端延迟与丢块
+# author: Zhangsong
+
+# 用法:
+#   服务端: python ecg_replay.py serve 数据.mat --markers points_mark.txt --speed 1 --block 50
+#   客户端: python ecg_replay.py client --hrv
+# 服务端只接受一个客户端，回放结束后退出。
+
+import argparse
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from ecg_io import open_ecg_cache
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 50007
+MARKER_LABELS = (12, 15)   # 12: 算法开启，15: 算法关闭
+
+# 每条消息: 类型(1字节) 序号 起始样本 发送时刻 数量/标签，数据块后跟 n 个 float32 样本
+# 'H' 开始: 序号=0, 起始样本=总样本数, 发送时刻=采样率, 数量=块大小
+# 'D' 数据块, 'M' 标签(数量字段为标签值), 'E' 结束(数量字段为服务端丢弃的块数)
+HEADER = struct.Struct('<cIqdI')
+
+
+def read_markers(markers_path, labels=MARKER_LABELS):
+    """
+    读取 points_mark.txt（每行 "时刻(ms),标签"），只保留指定标签。
+
+    返回:
+        list[(time_ms, label)]  按时间排序
+    """
+    markers = []
+    with open(markers_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            time_str, label_str = line.split(',')
+            label = int(label_str)
+            if label in labels:
+                markers.append((float(time_str), label))
+    markers.sort()
+    return markers
+
+
+def _recv_exact(conn, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = conn.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("连接已关闭")
+        got += k
+    return bytes(buf)
+
+
+def _sender(conn, send_queue):
+    """
+    发送线程：从队列取消息写入 socket，收到 None 时结束。
+    """
+    while True:
+        message = send_queue.get()
+        if message is None:
+            break
+        conn.sendall(message)
+
+
+def serve_replay(source_path, host=DEFAULT_HOST, port=DEFAULT_PORT, speed=1.0, block_size=50,
+                 markers_path=None, max_queue=64, start_seconds=0.0, duration_seconds=None):
+    """
+    回放一个记录的心电通道，等待一个客户端连接后开始发送。
+
+    参数:
+        source_path : str         .mat 或 .edf 文件
+        speed : float             回放倍速，1 为实时，<=0 表示不限速（最快）
+        block_size : int          每块样本数
+        markers_path : str|None   points_mark.txt 路径，标签在其所在数据块发出后立即发送
+        max_queue : int           发送队列长度；限速回放时客户端跟不上、队列满则丢弃数据块（模拟采集设备），
+                                  标签（算法开启/关闭）不受限制，总是按顺序发送
+        start_seconds, duration_seconds : 只回放其中一段
+
+    返回:
+        dict  {'blocks': 发送块数, 'dropped': 丢弃块数, 'markers': 标签数, 'elapsed_s': 用时}
+    """
+    ecg_data, sampling_rate = open_ecg_cache(source_path)
+    start = int(start_seconds * sampling_rate)
+    end = len(ecg_data) if duration_seconds is None else min(len(ecg_data), start + int(duration_seconds * sampling_rate))
+
+    markers = read_markers(markers_path) if markers_path else []
+    marker_samples = [(int(t_ms / 1000 * sampling_rate), label) for t_ms, label in markers]
+    marker_samples = [(s, label) for s, label in marker_samples if start <= s < end]
+
+    realtime = speed > 0
+    # 队列本身不设上限，保证标签总能入队；数据块的上限在入队前按 qsize 判断（只有本线程入队，不会超出）
+    send_queue = queue.Queue()
+
+    with socket.create_server((host, port)) as server:
+        print(f"等待客户端连接 {host}:{port} ...")
+        conn, addr = server.accept()
+        with conn:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sender = threading.Thread(target=_sender, args=(conn, send_queue), daemon=True)
+            sender.start()
+            send_queue.put(HEADER.pack(b'H', 0, end - start, float(sampling_rate), block_size))
+
+            n_blocks = n_dropped = 0
+            k_marker = 0
+            t0 = time.time()
+            for seq, block_start in enumerate(range(start, end, block_size)):
+                block_end = min(block_start + block_size, end)
+                if realtime:
+                    # 块的最后一个样本"采集完成"的时刻再发送
+                    due = t0 + (block_end - start) / sampling_rate / speed
+                    delay = due - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                samples = np.ascontiguousarray(ecg_data[block_start:block_end], dtype='<f4')
+                message = HEADER.pack(b'D', seq, block_start, time.time(), len(samples)) + samples.tobytes()
+                if realtime and send_queue.qsize() >= max_queue:
+                    n_dropped += 1
+                else:
+                    send_queue.put(message)
+                n_blocks += 1
+
+                while k_marker < len(marker_samples) and marker_samples[k_marker][0] < block_end:
+                    sample, label = marker_samples[k_marker]
+                    send_queue.put(HEADER.pack(b'M', seq, sample, time.time(), label))  # 不阻塞，也不丢弃
+                    k_marker += 1
+
+            send_queue.put(HEADER.pack(b'E', n_blocks, end, time.time(), n_dropped))
+            send_queue.put(None)
+            sender.join()
+
+    stats = {'blocks': n_blocks, 'dropped': n_dropped, 'markers': k_marker, 'elapsed_s': time.time() - t0}
+    print(f"回放结束：{stats}")
+    return stats
+
+
+def run_client(host=DEFAULT_HOST, port=DEFAULT_PORT, on_start=None, on_block=None, on_marker=None,
+               connect_timeout=10.0):
+    """
+    连接回放服务，接收全部数据块并统计延迟与丢块。
+
+    参数:
+        on_start : callable(sampling_rate, total_samples, block_size) | None   收到开始消息时调用
+        on_block : callable(samples, block_start, recv_time) | None   每块的处理函数（例如在线 HRV）
+        on_marker : callable(label, sample) | None                    标签回调
+
+    返回:
+        dict  接收块数、丢块数（序号缺口 + 服务端丢弃）、标签、
+              传输延迟（发送→接收）与端到端延迟（发送→处理完成）的中位数/95分位/最大值（秒）、吞吐（样本/秒）
+    """
+    deadline = time.time() + connect_timeout
+    while True:
+        try:
+            conn = socket.create_connection((host, port))
+            break
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+    transport_lags, end_to_end_lags, markers = [], [], []
+    n_blocks = n_samples = gaps = server_dropped = 0
+    expected_seq = 0
+    t_first = t_last = None
+    with conn:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        kind, _, total, sampling_rate, block_size = HEADER.unpack(_recv_exact(conn, HEADER.size))
+        if kind != b'H':
+            raise ValueError("回放协议错误：缺少开始消息")
+        if on_start is not None:
+            on_start(sampling_rate, total, block_size)
+
+        while True:
+            kind, seq, sample, sent_at, count = HEADER.unpack(_recv_exact(conn, HEADER.size))
+            if kind == b'D':
+                samples = np.frombuffer(_recv_exact(conn, count * 4), dtype='<f4')
+                recv_time = time.time()
+                t_first = recv_time if t_first is None else t_first
+                gaps += seq - expected_seq
+                expected_seq = seq + 1
+                if on_block is not None:
+                    on_block(samples, sample, recv_time)
+                t_last = time.time()
+                transport_lags.append(recv_time - sent_at)
+                end_to_end_lags.append(t_last - sent_at)
+                n_blocks += 1
+                n_samples += count
+            elif kind == b'M':
+                markers.append((sample / sampling_rate, count))
+                if on_marker is not None:
+                    on_marker(count, sample)
+            elif kind == b'E':
+                server_dropped = count
+                gaps += seq - expected_seq
+                break
+            else:
+                raise ValueError(f"回放协议错误：未知消息类型 {kind!r}")
+
+    stats = {'sampling_rate': sampling_rate, 'blocks': n_blocks, 'dropped': gaps,
+             'server_dropped': server_dropped, 'markers': markers}
+    for name, lags in (('transport', transport_lags), ('end_to_end', end_to_end_lags)):
+        if lags:
+            lags = np.asarray(lags)
+            stats[f'{name}_lag_median'] = float(np.median(lags))
+            stats[f'{name}_lag_p95'] = float(np.percentile(lags, 95))
+            stats[f'{name}_lag_max'] = float(lags.max())
+    if n_blocks > 1 and t_last > t_first:
+        stats['throughput_samples_per_s'] = n_samples / (t_last - t_first)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="心电回放服务与客户端测试程序")
+    sub = parser.add_subparsers(dest='mode', required=True)
+
+    serve = sub.add_parser('serve', help="回放 .mat / .edf 心电")
+    serve.add_argument('source')
+    serve.add_argument('--markers', default=None, help="points_mark.txt 路径")
+    serve.add_argument('--speed', type=float, default=1.0, help="回放倍速，0 表示最快")
+    serve.add_argument('--block', type=int, default=50, help="每块样本数")
+    serve.add_argument('--start', type=float, default=0.0, help="起始时刻(秒)")
+    serve.add_argument('--duration', type=float, default=None, help="回放时长(秒)")
+
+    client = sub.add_parser('client', help="接收回放并统计延迟与丢块")
+    client.add_argument('--hrv', action='store_true', help="同时运行在线 HRV，统计逐搏延迟")
+    client.add_argument('--report', default=None, help="统计结果保存为 JSON")
+
+    for p in (serve, client):
+        p.add_argument('--host', default=DEFAULT_HOST)
+        p.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if args.mode == 'serve':
+        serve_replay(args.source, args.host, args.port, speed=args.speed, block_size=args.block,
+                     markers_path=args.markers, start_seconds=args.start, duration_seconds=args.duration)
+        return
+
+    engines = []
+
+    def start_hrv(sampling_rate, total, block_size):
+        from online_hrv import OnlineHRV
+        engines.append(OnlineHRV(sampling_rate))
+
+    def push_hrv(samples, block_start, recv_time):
+        engines[0].push(samples, arrival_time=time.perf_counter())
+
+    def on_marker(label, sample):
+        print(f"标签 {label} @ 样本 {sample}")
+
+    stats = run_client(args.host, args.port, on_start=start_hrv if args.hrv else None,
+                       on_block=push_hrv if args.hrv else None, on_marker=on_marker)
+    if engines:
+        stats['hrv_beats'] = len(engines[0].latencies)
+        stats.update({f'hrv_{k}': v for k, v in engines[0].latency_stats().items()})
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+# function: HRV 批处理的核心库：文件定位、心电读取、RR 清理与特征、滑窗 SDNN/RMSSD 与全特征、单个刺激配对/被试的处理任务。
+#           导入时只加载 numpy / h5py，neurokit2、hrvanalysis、pandas 在用到时才导入；
+#           auto_sdnn_rmssd_demo.py、demo1.py 等脚本只保留路径参数和流程
+# author: Zhangsong
+
+import json
+import os
+import re
+from typing import Optional
+
+import numpy as np
+
+from ecg_io import read_mat_channel, open_ecg_cache, ecg_cache_exists, MAT_ECG_CHANNEL
+from rpeak_detect import detect_rpeaks, get_detector
+from peak_cache import cached_rpeaks
+from signal_quality import window_quality
+from profiling import is_quiet, log, stage, profiled
+from hrv_windows import ecg_windows, window_bounds, window_peak_ranges, window_rr_intervals
+from hrv_features import (window_time_domain, window_frequency_domain, window_poincare, window_geometric,
+                          peak_to_rr_ranges, FREQ_FEATURES, TIME_FEATURES)
+from hrv_nonlinear import window_nonlinear
+from rr_cleaning import clean_rr_intervals
+
+
+def resolve_eeg_mat_path(name: str, source_folder: str, verify_exists: bool = True) -> Optional[str]:
+    """
+    根据输入的名称生成对应的 .mat 文件路径。
+    参数:
+        name : str            输入名称 (如 'SLP014_Day2_up')
+        source_folder : str   目录路径
+        verify_exists : bool  是否检查文件是否真实存在
+
+    返回:
+        str | None  对应的文件绝对路径或 None
+    """
+    if not isinstance(name, str) or not name:
+        return None
+
+    parts = name.split('_')
+    if len(parts) < 2:
+        return None
+
+    subject = parts[0]  # 例如 SLP014
+
+    # Day1 情况
+    if parts[1] == 'Day1':
+        filename = f"{subject}_base_eeg_data.mat"
+
+    # up / down 情况
+    elif len(parts) >= 3 and parts[2] in ('up', 'down'):
+        # 如果要去掉首字母 S，改为 subject[1:]
+        filename = f"{subject}_{parts[2]}_eeg_data.mat"
+    else:
+        return None
+
+    full_path = os.path.join(source_folder, filename)
+
+    if verify_exists and not os.path.isfile(full_path):
+        return None
+
+    return full_path
+
+def load_dict_from_json(file_path: str) -> dict:
+    """
+    从 JSON 文件加载字典。
+
+    :param file_path: JSON 文件的路径。
+    :return: 加载后的字典，如果文件不存在或出错则返回空字典。
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as json_file:
+            data = json.load(json_file)
+        print(f"字典已从 {file_path} 加载。")
+        return data
+    except FileNotFoundError:
+        print(f"错误: 文件 '{file_path}' 未找到。")
+        return {}
+    except json.JSONDecodeError:
+        print(f"错误: 文件 '{file_path}' 不是有效的 JSON 格式。")
+        return {}
+
+def get_ecg(mat_path, ranges=None, use_cache=True, cache_dir=None):
+    """
+    输入: mat_path (.mat 文件路径，HDF5格式，包含键 'Totol_data')
+          ranges   可选的 [(start, end), ...] 采样区间，只读取这些区间
+          use_cache 是否使用 memmap 心电缓存（源文件变化时自动重建）。给定 ranges 且缓存尚未生成时
+                    直接按区间读取源文件、不生成缓存；只有读取整个通道时才做首次转换
+          cache_dir 缓存目录，None 时与源文件同目录
+    输出: 第7列(索引6)的 ecg_data ndarray；给定 ranges 时为对应区间的 ndarray 列表
+    """
+    if use_cache and (ranges is None or ecg_cache_exists(mat_path, cache_dir)):
+        ecg_data, _ = open_ecg_cache(mat_path, cache_dir)
+        if ranges is None:
+            return ecg_data
+        return [ecg_data[int(start):int(end)] for start, end in ranges]
+    return read_mat_channel(mat_path, MAT_ECG_CHANNEL, ranges)
+
+def compute_hrv_features(rr_intervals_ms):
+    """清理 RR 间期并计算 HRV 特征"""
+    # hrvanalysis 导入约 2.5 s，只有逐窗口计算时才用到
+    from hrvanalysis import get_time_domain_features
+    from hrvanalysis.preprocessing import remove_outliers, remove_ectopic_beats, interpolate_nan_values
+
+    # --- 清理 ---
+
+    with stage('clean', beats=len(rr_intervals_ms)):
+        rr_clean = remove_outliers(rr_intervals_ms, low_rri=300, high_rri=2000, verbose=not is_quiet())
+        rr_clean = remove_ectopic_beats(rr_clean, method="kamath", verbose=not is_quiet())
+        rr_clean = interpolate_nan_values(rr_clean, interpolation_method="linear")
+
+    log(f"rr_clean的数据类型为：{type(rr_clean)}")
+    log(f"rr_clean的值为：{rr_clean}")
+
+    # --- HRV 特征 ---
+    features = {}
+    with stage('features', windows=1):
+        features.update(get_time_domain_features(rr_intervals_ms))
+    return features
+
+
+def hrv_sliding_windows(ecg_data, sampling_rate, window_minutes=5, step_seconds=30,
+                        rpeaks=None, detect_once=True, clean_rr=False, tail='drop', quality_gate=False):
+    """
+    使用简单滑窗（固定窗口、固定步长）计算每个窗口的 SDNN 和 RMSSD。
+
+    参数：
+    ecg_data：需计算的心电数据
+    sampling_rate：采样率
+    window_miutes:时间窗
+    step_seconds：步长
+    rpeaks：ecg_data 上已检测好的 R 峰索引（如整晚检测一次后用 slice_rpeaks 切出的本段），
+            为 None 时在本段上检测一次
+    detect_once：True 时整段只检测一次 R 峰，各窗口用 searchsorted 在峰索引上切片；
+                 False 时沿用旧方式，每个窗口重新检测
+    clean_rr：True 时先对整段 RR 一次性清理（去异常值、Kamath 去异位、线性插值）再计算窗口特征；
+              默认 False，与以往结果一致（特征基于未清理的 RR 间期）
+    tail：末尾不足一个窗口的数据的处理方式（见 hrv_windows.window_bounds），默认 'drop' 与以往一致
+    quality_gate：True 时先评估各窗口信号质量（signal_quality.window_quality），
+                  不合格窗口的 SDNN/RMSSD 记为 NaN（逐窗检测模式下不再检测），并返回各窗口的质量评分
+
+    返回:
+        SDNN_list, RMSSD_list；quality_gate=True 时为 SDNN_list, RMSSD_list, QUALITY_list
+    """
+
+    starts, ends = window_bounds(len(ecg_data), sampling_rate, window_minutes, step_seconds, tail=tail)
+    n_windows = len(starts)
+    log(len(ecg_data), int(window_minutes * 60 * sampling_rate), int(step_seconds * sampling_rate))
+
+    log(f"窗口数量: {n_windows}")
+
+    keep = np.ones(n_windows, dtype=bool)
+    if quality_gate:
+        with stage('quality', samples=len(ecg_data), windows=n_windows):
+            quality = window_quality(ecg_data, sampling_rate, starts, ends)
+        keep = quality['quality_ok']
+        QUALITY_list = quality['quality'].tolist()
+        log(f"质量合格窗口: {int(keep.sum())}/{n_windows}")
+
+    # --- R 峰检测（整段一次），所有窗口的 SDNN/RMSSD 由向量化内核一次算出 ---
+    if detect_once:
+        if rpeaks is None:
+            with stage('detect', samples=len(ecg_data)) as counts:
+                rpeaks = detect_rpeaks(ecg_data, sampling_rate)
+                counts['beats'] = len(rpeaks)
+        lo, hi = window_peak_ranges(rpeaks, starts, ends)
+        rr_intervals_ms = window_rr_intervals(rpeaks, 0, len(rpeaks), sampling_rate)
+        if clean_rr:
+            with stage('clean', beats=len(rr_intervals_ms)):
+                rr_intervals_ms, _ = clean_rr_intervals(rr_intervals_ms)
+        with stage('features', beats=len(rr_intervals_ms), windows=n_windows):
+            features = window_time_domain(rr_intervals_ms, *peak_to_rr_ranges(lo, hi))
+
+        SDNN_list = np.where(keep, features["sdnn"], np.nan).tolist()
+        RMSSD_list = np.where(keep, features["rmssd"], np.nan).tolist()
+        for w in range(n_windows):
+            log(f"窗口 {w}: SDNN={SDNN_list[w]:.2f}, RMSSD={RMSSD_list[w]:.2f}")
+        if quality_gate:
+            return SDNN_list, RMSSD_list, QUALITY_list
+        return SDNN_list, RMSSD_list
+
+    SDNN_list = []
+    RMSSD_list = []
+    segments = ecg_windows(ecg_data, starts, ends)  # 各窗口心电的视图，不复制
+
+    for w in range(n_windows):
+        # --- R 峰检测 + RR 间期 (ms) ---
+        if not keep[w]:  # 信号质量不合格，不做检测
+            SDNN_list.append(np.nan)
+            RMSSD_list.append(np.nan)
+            continue
+        ecg_segment = segments[w]
+        with stage('detect', samples=len(ecg_segment)) as counts:
+            window_rpeaks = detect_rpeaks(ecg_segment, sampling_rate)
+            counts['beats'] = len(window_rpeaks)
+        rr_intervals_ms = window_rr_intervals(window_rpeaks, 0, len(window_rpeaks), sampling_rate)
+
+        if len(rr_intervals_ms) < 1:  # R 峰少于 2 个
+            SDNN_list.append(np.nan)
+            RMSSD_list.append(np.nan)
+            continue
+
+        # --- 使用你的函数清理 RR + 提取特征 ---
+        features = compute_hrv_features(rr_intervals_ms)
+
+        # --- 仅取 SDNN 和 RMSSD ---
+        SDNN = features.get("sdnn", np.nan)
+        RMSSD = features.get("rmssd", np.nan)
+
+        SDNN_list.append(SDNN)
+        RMSSD_list.append(RMSSD)
+
+        log(f"窗口 {w}: SDNN={SDNN:.2f}, RMSSD={RMSSD:.2f}")
+
+    if quality_gate:
+        return SDNN_list, RMSSD_list, QUALITY_list
+    return SDNN_list, RMSSD_list
+
+
+def hrv_feature_windows(ecg_data, sampling_rate, window_minutes=1, step_seconds=60, detect_once=True, rpeaks=None,
+                        tail='drop', detector='neurokit', quality_gate=False):
+    """
+    整晚滑窗的全部 HRV 特征（时域、频域、Poincaré、非线性），demo1.py 的计算部分。
+
+    参数:
+        ecg_data : ndarray      整晚心电
+        sampling_rate : float   采样率
+        window_minutes, step_seconds : 窗口长度（分钟）和步长（秒）
+        detect_once : bool      True 时整晚只检测一次 R 峰，时域/频域/Poincaré/非线性特征批量计算
+        rpeaks : ndarray|None   已检测好的整晚 R 峰（如 peak_cache.cached_rpeaks 的结果）
+        tail, detector, quality_gate : 见 hrv_sliding_windows
+
+    返回:
+        dict  {工作表名: DataFrame}，键为 'Time_Domain' / 'Frequency_Domain' / 'Poincare_Domain' / 'Geometric_Domain'
+              / 'Nonlinear_Domain'；几何特征（三角指数、TINN）、Poincaré 椭圆面积和非线性特征只在 detect_once 时计算
+    """
+    import pandas as pd
+    # tail: 末尾不足一个窗口的数据如何处理，'drop' / 'partial' / 'align_end'，见 hrv_windows.window_bounds
+    starts, ends = window_bounds(len(ecg_data), sampling_rate, window_minutes, step_seconds, tail=tail)
+    segments = ecg_windows(ecg_data, starts, ends)  # 各窗口心电的视图，不复制
+    # detector: R 峰检测器名称（见 rpeak_detect.DETECTORS，如 'neurokit'、'ecgdet_pan_tompkins'、'numpy'）
+    detect_fn = get_detector(detector)
+    n_windows = len(starts) #窗口数量
+    log(f"窗口数量: {n_windows}")
+
+    # 各窗口信号质量（平线、削波、幅度、峭度），评分写入结果；
+    # quality_gate=True 时不合格的窗口不做 R 峰检测和 HRV 计算
+    with stage('quality', windows=n_windows):
+        quality = window_quality(ecg_data, sampling_rate, starts, ends)
+    keep = quality['quality_ok'] if quality_gate else np.ones(n_windows, dtype=bool)
+    log(f"质量合格窗口: {int(quality['quality_ok'].sum())}/{n_windows}")
+    batch_index = np.cumsum(keep) - 1  # 第 w 个窗口在批量结果中的位置
+
+    # 整晚只检测一次 R 峰，各窗口在峰索引数组上切片
+    if detect_once:
+        if rpeaks is not None:
+            record_rpeaks = rpeaks
+        else:
+            with stage('detect', samples=len(ecg_data)) as counts:
+                record_rpeaks = detect_fn(ecg_data, sampling_rate)
+                counts['beats'] = len(record_rpeaks)
+        lo, hi = window_peak_ranges(record_rpeaks, starts, ends)
+        with stage('features', windows=int(keep.sum()), beats=len(record_rpeaks)):
+            record_rr_ms = np.diff(record_rpeaks) / sampling_rate * 1000
+            rr_lo, rr_hi = peak_to_rr_ranges(lo[keep], hi[keep])
+            # 所有（合格）窗口的时域特征一次批量算出（累加和），中位数逐窗口求
+            time_batch = window_time_domain(record_rr_ms, rr_lo, rr_hi)
+            time_batch['median_nni'] = np.array([np.median(record_rr_ms[a:b]) if b > a else np.nan
+                                                 for a, b in zip(rr_lo, rr_hi)])
+            # 频域特征
+            freq_batch = window_frequency_domain(record_rpeaks, sampling_rate, starts[keep], ends[keep])
+            # Poincaré 特征
+            poincare_batch = window_poincare(record_rr_ms, rr_lo, rr_hi)
+            # 几何特征（HRV 三角指数、TINN），直方图在窗口间增量滑动
+            geometric_batch = window_geometric(record_rr_ms, rr_lo, rr_hi)
+            # 非线性特征（样本熵、近似熵、DFA）
+            nonlinear_batch = window_nonlinear(record_rr_ms, rr_lo, rr_hi)
+
+    results_time = [] #保存时域结果
+    results_freq = [] #保存频域结果
+    results_poincare = [] #保存poincare结果
+    results_geometric = [] #保存几何特征结果
+    results_nonlinear = [] #保存非线性结果
+    
+    for w in range(n_windows):
+        start = starts[w]
+        ecg_segment = segments[w]
+
+        if not keep[w]:
+            log(f"窗口 {w}：信号质量不合格（评分 {quality['quality'][w]:.2f}），跳过")
+            continue
+
+        '''
+        #检测R峰
+        rpeaks = detectors.pan_tompkins_detector(ecg_segment,MWA_name='cumulative')
+        '''
+
+        if detect_once:
+            rpeaks = record_rpeaks[lo[w]:hi[w]] - start
+        else:
+            rpeaks = detect_fn(ecg_segment, sampling_rate)
+
+        '''画图检测R峰'''
+        '''
+        plt.figure(figsize=(15,4))
+        plt.plot(ecg_segment, label="ECG")
+        plt.plot(rpeaks, ecg_segment[rpeaks], "ro", label="R peaks")
+        plt.title("R peak detection")
+        plt.xlabel("Samples")
+        plt.ylabel("Amplitude")
+        plt.legend()
+        plt.show()
+        '''
+        
+        if len(rpeaks) < 2:
+            log(f"窗口 {w}：R 峰太少，跳过")
+            continue
+
+        # 计算 RR 间期 (ms)
+        rpeaks_times = np.array(rpeaks) / sampling_rate
+        rr_intervals_ms = np.diff(rpeaks_times) * 1000
+
+        #   ==== 计算 HRV 时域特征 ===
+        if detect_once:
+            features_time = {key: time_batch[key][batch_index[w]] for key in TIME_FEATURES}
+        else:
+            features_time = compute_hrv_features(rr_intervals_ms)
+        features_time["time"] = w 
+        features_time["quality"] = quality['quality'][w]
+        results_time.append(features_time)
+       
+        #   ==== 计算 HRV 频域特征 ===
+        if detect_once:
+            features_freq = {key: freq_batch[key][batch_index[w]] for key in FREQ_FEATURES}
+        else:
+            from hrvanalysis import get_frequency_domain_features
+            features_freq = get_frequency_domain_features(rr_intervals_ms)
+        features_freq["time"] = w 
+        results_freq.append(features_freq)
+
+        #   ==== 计算 HRV Poincare 特征 ===
+        if detect_once:
+            features_poincare = {key: poincare_batch[key][batch_index[w]]
+                                 for key in ("sd1", "sd2", "ratio_sd2_sd1", "ellipse_area")}
+        else:
+            from hrvanalysis import get_poincare_plot_features
+            features_poincare = get_poincare_plot_features(rr_intervals_ms)
+        features_poincare["time"] = w
+        results_poincare.append(features_poincare)
+
+        #   ==== HRV 几何特征（仅整段检测模式）===
+        if detect_once:
+            features_geometric = {key: values[batch_index[w]] for key, values in geometric_batch.items()}
+            features_geometric["time"] = w
+            results_geometric.append(features_geometric)
+
+        #   ==== HRV 非线性特征（仅整段检测模式）===
+        if detect_once:
+            features_nonlinear = {key: values[batch_index[w]] for key, values in nonlinear_batch.items()}
+            features_nonlinear["time"] = w
+            results_nonlinear.append(features_nonlinear)
+
+    #转DataFrame
+    return {
+        "Time_Domain": pd.DataFrame(results_time),
+        "Frequency_Domain": pd.DataFrame(results_freq),
+        "Poincare_Domain": pd.DataFrame(results_poincare),
+        "Geometric_Domain": pd.DataFrame(results_geometric),
+        "Nonlinear_Domain": pd.DataFrame(results_nonlinear),
+    }
+
+
+def transform_name(name: str):
+    """
+    根据输入名称生成加工后的名称。
+    """
+    if not isinstance(name, str):
+        return None
+
+    parts = name.strip().split('_')
+    if len(parts) < 2:
+        return None
+
+    # 提取前缀中的数字 (如 SLP014 -> 014 -> 14)
+    m = re.match(r'^SLP(\d+)$', parts[0])
+    if not m:
+        return None
+    num_str = m.group(1)
+    num_clean = str(int(num_str))  # 去除前导零
+
+    # 情况一：Day1
+    if parts[1] == 'Day1':
+        return f"{num_clean}_base"
+
+    # 情况二：有第三部分为 up 或 down
+    if len(parts) >= 3 and parts[2] in ('up', 'down'):
+        return f"{num_clean}_{parts[2]}"
+
+    return None
+
+
+# ------------------------------------单个任务（可在子进程中执行）---------------------------------------------------
+WAVE_SHEETS = ("firstWave", "secondWave")  # 第一、第二个慢波刺激配对分别保存到的工作表（旧 Excel 的 secondtWave 导入时改名）
+
+
+def process_wave(mat_path, pair, sampling_rate, detector='neurokit', gate=False, profile_dir=None, cache_dir=None):
+    """
+    处理一个刺激配对：读取该区间心电 → R 峰（带缓存，detector 为 rpeak_detect.DETECTORS 中的名称）→ 滑窗 SDNN/RMSSD。
+    gate=True 时做窗口信号质量筛选，结果多一项各窗口的质量评分。
+    profile_dir 不为 None 时用 cProfile 记录本配对，结果保存到该目录。
+    cache_dir 为心电 memmap 缓存目录（None 时与源文件同目录），缓存不存在时按区间直接读取源文件。
+
+    返回:
+        (SDNN_list, RMSSD_list) 或 (SDNN_list, RMSSD_list, QUALITY_list)，出错时各项为 None
+    """
+    start, end = pair
+    with profiled(f"{os.path.basename(mat_path)}_{start}", profile_dir):
+        with stage('load') as counts:
+            ecg_segment = np.array(get_ecg(mat_path, [pair], cache_dir=cache_dir)[0], dtype=np.float64)  # 在此真正读盘
+            counts['samples'] = len(ecg_segment)
+        try:
+            with stage('detect', samples=len(ecg_segment)) as counts:
+                rpeaks = cached_rpeaks(mat_path, ecg_segment, sampling_rate, start, end, detector=detector)
+                counts['beats'] = len(rpeaks)
+            return hrv_sliding_windows(ecg_segment, sampling_rate, rpeaks=rpeaks, quality_gate=gate)
+        except Exception as e:
+            print("处理文件时出错:", e)
+            return (None, None, None) if gate else (None, None)
+
+
+def process_subject(mat_path, pairs, sampling_rate, detector='neurokit', gate=False, profile_dir=None,
+                    cache_dir=None):
+    """
+    依次处理一个被试的各个刺激配对，返回 [(SDNN_list, RMSSD_list), ...]。
+    profile_dir 不为 None 时整个被试记录为一个 cProfile 文件。
+    """
+    with profiled(os.path.basename(mat_path), profile_dir):
+        return [process_wave(mat_path, pair, sampling_rate, detector, gate, cache_dir=cache_dir)
+                for pair in pairs]
@@ -0,0 +1,322 @@
+# function: 向量化的 HRV 特征计算，一次调用算出所有滑窗的结果
+# author: Zhangsong
+
+import numpy as np
+
+
+def _window_sums(values, lo, hi):
+    """
+    用累加和求每个窗口 values[lo:hi] 的和。
+    """
+    csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return csum[hi] - csum[lo]
+
+
+def _window_reduce(ufunc, values, lo, hi):
+    """
+    用 ufunc.reduceat 求每个窗口 values[lo:hi] 的 min/max（窗口可重叠，空窗口为 NaN）。
+    """
+    out = np.full(len(lo), np.nan)
+    valid = hi > lo
+    if not valid.any():
+        return out
+    padded = np.append(values, values[-1])  # reduceat 的下标不能等于数组长度
+    idx = np.empty(2 * valid.sum(), dtype=np.int64)
+    idx[0::2] = lo[valid]
+    idx[1::2] = hi[valid]
+    out[valid] = ufunc.reduceat(padded, idx)[0::2]
+    return out
+
+
+def peak_to_rr_ranges(lo, hi):
+    """
+    把窗口内 R 峰的下标范围 [lo, hi) 换算为 RR 间期（np.diff(rpeaks)）的下标范围 [lo, hi-1)。
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    return lo, np.maximum(hi - 1, lo)
+
+
+def window_time_domain(rr_intervals_ms, lo, hi):
+    """
+    一次性计算所有窗口的时域 HRV 特征，与 hrvanalysis.get_time_domain_features 的定义一致
+    （pnni 以 RR 间期个数减一为分母）。窗口由 RR 间期下标范围 [lo, hi) 给出，可以重叠。
+    均值、方差、RMSSD、NN50 等由 RR 及逐差平方的累加和求得，min/max 由 reduceat 求得；
+    median_nni 无法用累加和得到，这里不计算。
+
+    参数:
+        rr_intervals_ms : ndarray  整段 RR 间期 (ms)
+        lo, hi : ndarray           每个窗口在 rr_intervals_ms 中的下标范围
+
+    返回:
+        dict  {特征名: ndarray}，键名同 hrvanalysis；RR 少于 2 个的窗口为 NaN
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    n = (hi - lo).astype(np.float64)
+    n_diff = n - 1
+    valid = n >= 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # --- RR 均值与 SDNN（先减去整体均值，减小累加和的舍入误差）---
+        shift = rr.mean() if len(rr) else 0.0
+        centered = rr - shift
+        s1 = _window_sums(centered, lo, hi)
+        s2 = _window_sums(centered ** 2, lo, hi)
+        mean_nni = shift + s1 / n
+        sdnn = np.sqrt(np.maximum(s2 - s1 ** 2 / n, 0.0) / n_diff)
+
+        # --- 逐差：第 i 个逐差属于窗口当且仅当 lo <= i < hi-1 ---
+        diff_nni = np.diff(rr)
+        d_hi = np.maximum(hi - 1, lo)
+        d2 = _window_sums(diff_nni ** 2, lo, d_hi)
+        d_sum = np.where(valid, rr[np.minimum(d_hi, len(rr) - 1)] - rr[np.minimum(lo, len(rr) - 1)], np.nan)
+        rmssd = np.sqrt(d2 / n_diff)
+        sdsd = np.sqrt(np.maximum(d2 / n_diff - (d_sum / n_diff) ** 2, 0.0))
+        nni_50 = _window_sums(np.abs(diff_nni) > 50, lo, d_hi)
+        nni_20 = _window_sums(np.abs(diff_nni) > 20, lo, d_hi)
+        pnni_50 = 100 * nni_50 / n_diff
+        pnni_20 = 100 * nni_20 / n_diff
+
+        # --- 心率 ---
+        heart_rate = 60000 / rr
+        hr_shift = heart_rate.mean() if len(rr) else 0.0
+        hr_centered = heart_rate - hr_shift
+        h1 = _window_sums(hr_centered, lo, hi)
+        h2 = _window_sums(hr_centered ** 2, lo, hi)
+        mean_hr = hr_shift + h1 / n
+        std_hr = np.sqrt(np.maximum(h2 / n - (h1 / n) ** 2, 0.0))
+
+        min_nni = _window_reduce(np.minimum, rr, lo, hi)
+        max_nni = _window_reduce(np.maximum, rr, lo, hi)
+
+        features = {
+            'mean_nni': mean_nni,
+            'sdnn': sdnn,
+            'sdsd': sdsd,
+            'nni_50': nni_50,
+            'pnni_50': pnni_50,
+            'nni_20': nni_20,
+            'pnni_20': pnni_20,
+            'rmssd': rmssd,
+            'range_nni': max_nni - min_nni,
+            'cvsd': rmssd / mean_nni,
+            'cvnni': sdnn / mean_nni,
+            'mean_hr': mean_hr,
+            'max_hr': 60000 / min_nni,
+            'min_hr': 60000 / max_nni,
+            'std_hr': std_hr,
+        }
+
+    for key in features:
+        features[key] = np.where(valid, features[key], np.nan)
+    return features
+
+
+# hrvanalysis.get_time_domain_features 的特征顺序（median_nni 由调用方另算，见 hrv_core.hrv_feature_windows）
+TIME_FEATURES = ('mean_nni', 'sdnn', 'sdsd', 'nni_50', 'pnni_50', 'nni_20', 'pnni_20', 'rmssd', 'median_nni',
+                 'range_nni', 'cvsd', 'cvnni', 'mean_hr', 'max_hr', 'min_hr', 'std_hr')
+FREQ_FEATURES = ('lf', 'hf', 'lf_hf_ratio', 'lfnu', 'hfnu', 'total_power', 'vlf')
+
+
+def _band_power(freq, psd, band):
+    """
+    对每一行 PSD 在频带 [low, high) 内做梯形积分。
+    """
+    from scipy.integrate import trapezoid
+    mask = (freq >= band[0]) & (freq < band[1])
+    return trapezoid(psd[:, mask], x=freq[mask], axis=-1)
+
+
+def window_frequency_domain(rpeaks, sampling_rate, starts, ends, interp_fs=4,
+                            vlf_band=(0.003, 0.04), lf_band=(0.04, 0.15), hf_band=(0.15, 0.40),
+                            nfft=4096):
+    """
+    批量计算所有窗口的频域 HRV 特征（Welch 法，参数同 hrvanalysis.get_frequency_domain_features）。
+    整晚 RR 间期序列只构造一次；每个窗口的插值网格从窗口内第一个 RR 的时刻开始（与 hrvanalysis 相同），
+    按网格长度分组后，一组窗口的插值是一次 np.interp，PSD 是一次二维 Welch（批量 FFT）。
+
+    参数:
+        rpeaks : ndarray       整段 R 峰索引（升序）
+        sampling_rate : float  心电采样率
+        starts, ends : ndarray 每个窗口的起止采样点
+        interp_fs : float      RR 插值频率 (Hz)
+        vlf_band, lf_band, hf_band : tuple  频带 (Hz)
+        nfft : int             FFT 点数
+
+    返回:
+        dict  {特征名: ndarray}，键名同 hrvanalysis；RR 少于 3 个的窗口为 NaN
+    """
+    from scipy import signal  # 只有频域特征用到，用到时才导入
+    rpeaks = np.asarray(rpeaks, dtype=np.int64)
+    n_windows = len(starts)
+    features = {key: np.full(n_windows, np.nan) for key in FREQ_FEATURES}
+    if len(rpeaks) < 4 or n_windows == 0:
+        return features
+
+    # --- 整晚 RR 间期（时刻取 RR 的结束心搏，与 hrvanalysis 的累加时间轴一致）---
+    rr = np.diff(rpeaks) / sampling_rate * 1000
+    rr_times = rpeaks[1:] / sampling_rate
+
+    # --- 每个窗口内第一个、最后一个 RR 及插值网格长度 ---
+    lo, hi = np.searchsorted(rpeaks, starts, side='left'), np.searchsorted(rpeaks, ends, side='left')
+    valid = (hi - lo) >= 4
+    first_rr = np.clip(lo, 0, len(rr) - 1)
+    last_rr = np.clip(hi - 2, 0, len(rr) - 1)
+    g_len = np.ceil((rr_times[last_rr] - rr_times[first_rr]) * interp_fs - 1e-9).astype(np.int64)
+    valid &= g_len >= 2
+
+    # --- 按网格长度分组，每组一次批量 Welch ---
+    for length in np.unique(g_len[valid]):
+        rows = np.flatnonzero(valid & (g_len == length))
+        grid_times = rr_times[first_rr[rows], None] + np.arange(length) / interp_fs
+        segments = np.interp(grid_times, rr_times, rr)
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        freq, psd = signal.welch(segments, fs=interp_fs, window='hann',
+                                 nperseg=min(256, length), nfft=nfft, axis=-1)
+
+        vlf = _band_power(freq, psd, vlf_band)
+        lf = _band_power(freq, psd, lf_band)
+        hf = _band_power(freq, psd, hf_band)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features['lf'][rows] = lf
+            features['hf'][rows] = hf
+            features['vlf'][rows] = vlf
+            features['total_power'][rows] = vlf + lf + hf
+            features['lf_hf_ratio'][rows] = lf / hf
+            features['lfnu'][rows] = lf / (lf + hf) * 100
+            features['hfnu'][rows] = hf / (lf + hf) * 100
+    return features
+
+
+def window_poincare(rr_intervals_ms, lo, hi):
+    """
+    批量计算所有窗口的 Poincaré 特征（定义同 hrvanalysis.get_poincare_plot_features），另加椭圆面积。
+    RR 与逐差的方差都由累加和求得，窗口由 RR 间期下标范围 [lo, hi) 给出。
+
+    返回:
+        dict  {'sd1', 'sd2', 'ratio_sd2_sd1', 'ellipse_area': ndarray}；RR 少于 3 个的窗口为 NaN
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    n = (hi - lo).astype(np.float64)
+    valid = n >= 3
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # RR 方差 (ddof=1)
+        shift = rr.mean() if len(rr) else 0.0
+        centered = rr - shift
+        s1 = _window_sums(centered, lo, hi)
+        s2 = _window_sums(centered ** 2, lo, hi)
+        var_nni = np.maximum(s2 - s1 ** 2 / n, 0.0) / (n - 1)
+
+        # 逐差方差 (ddof=1)，窗口内共 n-1 个逐差
+        diff_nni = np.diff(rr)
+        d_hi = np.maximum(hi - 1, lo)
+        n_diff = n - 1
+        d1 = np.where(valid, rr[np.minimum(d_hi, len(rr) - 1)] - rr[np.minimum(lo, len(rr) - 1)], np.nan)
+        d2 = _window_sums(diff_nni ** 2, lo, d_hi)
+        var_diff = np.maximum(d2 - d1 ** 2 / n_diff, 0.0) / (n_diff - 1)
+
+        sd1 = np.sqrt(var_diff * 0.5)
+        sd2 = np.sqrt(2 * var_nni - 0.5 * var_diff)
+        features = {
+            'sd1': sd1,
+            'sd2': sd2,
+            'ratio_sd2_sd1': sd2 / sd1,
+            'ellipse_area': np.pi * sd1 * sd2,
+        }
+
+    for key in features:
+        features[key] = np.where(valid, features[key], np.nan)
+    return features
+
+
+def _tinn_from_histogram(counts, bin_width):
+    """
+    TINN：用三角形 q(N)=q(M)=0、q(X)=Y 以最小二乘拟合直方图，返回 (M-N)*bin_width。
+    三角形左右两边的误差互相独立，分别对 N、M 求最小即可。
+    """
+    n_bins = len(counts)
+    x = int(np.argmax(counts))
+    y = float(counts[x])
+    if y == 0:
+        return np.nan
+    d = counts.astype(np.float64)
+    i = np.arange(n_bins)
+
+    # 左边：N 取 0..x，区间 [N, x) 上 q 从 0 线性升到 Y，N 左侧 q=0
+    n_cand = np.arange(x + 1)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q_left = np.where(i[None, :x] >= n_cand, y * (i[None, :x] - n_cand) / (x - n_cand), 0.0)
+    left_err = ((d[None, :x] - q_left) ** 2).sum(axis=1)
+
+    # 右边：M 取 x..n_bins，区间 (x, M] 上 q 从 Y 线性降到 0，M 右侧 q=0
+    m_cand = np.arange(x, n_bins + 1)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q_right = np.where(i[None, x + 1:] <= m_cand, y * (m_cand - i[None, x + 1:]) / (m_cand - x), 0.0)
+    right_err = ((d[None, x + 1:] - q_right) ** 2).sum(axis=1)
+
+    n_best = int(np.argmin(left_err))
+    m_best = x + int(np.argmin(right_err))
+    return (m_best - n_best) * bin_width
+
+
+def window_geometric(rr_intervals_ms, lo, hi, low_rri=300, high_rri=2000, bin_width=8, tinn=True):
+    """
+    批量计算所有窗口的几何 HRV 特征：HRV 三角指数（定义同 hrvanalysis.get_geometrical_features，
+    直方图分箱为 range(300, 2000, 8)）和 TINN。
+    直方图在窗口间增量滑动：每移动一个窗口只加入新进入的 RR、减去移出的 RR，不重新统计。
+    要求 lo、hi 均单调不减（固定窗长、固定步长的滑窗满足）。
+
+    参数:
+        rr_intervals_ms : ndarray  整段 RR 间期 (ms)
+        lo, hi : ndarray           每个窗口在 rr_intervals_ms 中的下标范围
+        low_rri, high_rri, bin_width : int  直方图分箱
+        tinn : bool                是否计算 TINN（每个窗口一次三角拟合）
+
+    返回:
+        dict  {'triangular_index', 'tinn': ndarray}
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    if np.any(np.diff(lo) < 0) or np.any(np.diff(hi) < 0):
+        raise ValueError("window_geometric 要求窗口下标 lo、hi 单调不减")
+
+    # 与 np.histogram(rr, bins=range(low, high, width)) 相同的分箱：最后一个边界值归入最后一箱
+    edges = np.arange(low_rri, high_rri, bin_width)
+    n_bins = len(edges) - 1
+    with np.errstate(invalid='ignore'):
+        bin_idx = np.floor((rr - edges[0]) / bin_width)
+        bin_idx = np.where(rr == edges[-1], n_bins - 1, bin_idx)
+        in_range = (rr >= edges[0]) & (rr <= edges[-1])
+    bin_idx = np.where(in_range, bin_idx, -1).astype(np.int64)
+
+    counts = np.zeros(n_bins, dtype=np.int64)
+    triangular_index = np.full(len(lo), np.nan)
+    tinn_values = np.full(len(lo), np.nan)
+    cur_lo = cur_hi = 0
+
+    def _update(idx, sign):
+        idx = idx[idx >= 0]
+        if len(idx):
+            np.add.at(counts, idx, sign)
+
+    for w in range(len(lo)):
+        # 加入新进入窗口的 RR，再去掉移出窗口的 RR（窗口之间有间隔时即整体替换）
+        _update(bin_idx[max(cur_hi, lo[w]):hi[w]], 1)
+        _update(bin_idx[cur_lo:min(lo[w], cur_hi)], -1)
+        cur_lo, cur_hi = lo[w], hi[w]
+
+        n = hi[w] - lo[w]
+        peak = counts.max()
+        if n == 0 or peak == 0:
+            continue
+        triangular_index[w] = n / peak
+        if tinn:
+            tinn_values[w] = _tinn_from_histogram(counts, bin_width)
+
+    return {'triangular_index': triangular_index, 'tinn': tinn_values}
@@ -0,0 +1,181 @@
+# function: 非线性 HRV 特征（样本熵、近似熵、DFA α1/α2），KD 树计数 + 累加和去趋势，支持滑窗批量计算
+# author: Zhangsong
+
+import numpy as np
+
+DFA_SHORT_SCALES = np.arange(4, 17)                                             # α1：4~16 个心搏
+DFA_LONG_SCALES = np.unique(np.round(np.logspace(np.log10(16), np.log10(64), 10)).astype(int))  # α2：16~64 个心搏
+
+
+def _embed(x, dim):
+    """
+    延迟嵌入（lag=1），返回 (len(x)-dim+1, dim) 的模板矩阵（只读视图，不复制）。
+    """
+    return np.lib.stride_tricks.sliding_window_view(x, dim)
+
+
+def _count_pairs_below(templates, tolerance):
+    """
+    统计切比雪夫距离严格小于 tolerance 的模板对数（不含自身、无序）。
+    """
+    if len(templates) < 2:
+        return 0
+    from scipy.spatial import cKDTree  # scipy.spatial 导入约 0.5 s，用到时才导入
+    tree = cKDTree(templates)
+    radius = np.nextafter(tolerance, 0)  # cKDTree 的计数包含等于半径的点，这里取严格小于
+    return (int(tree.count_neighbors(tree, radius, p=np.inf)) - len(templates)) // 2
+
+
+def sample_entropy(x, emb_dim=2, tolerance=None):
+    """
+    样本熵，定义同 nolds.sampen（hrvanalysis.get_sampen 所用）：
+    模板取前 N-emb_dim 个，切比雪夫距离，严格小于 tolerance 计为匹配，tolerance 默认 0.2*std。
+    用 KD 树计数，复杂度约 O(N log N)，不再是逐对比较的 O(N²)。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if n <= emb_dim + 1:
+        return np.nan
+    if tolerance is None:
+        tolerance = 0.2 * np.std(x)
+    templates = _embed(x, emb_dim + 1)[:n - emb_dim]
+    count_m = _count_pairs_below(templates[:, :emb_dim], tolerance)
+    count_m1 = _count_pairs_below(templates, tolerance)
+    if count_m1 == 0:
+        return np.inf
+    return -np.log(count_m1 / count_m)
+
+
+def approximate_entropy(x, emb_dim=2, tolerance=None):
+    """
+    近似熵（Pincus）：phi(m) - phi(m+1)，phi(m) 为各模板（含自身）距离不超过 tolerance 的比例取对数后的均值。
+    每个模板的邻居数由 KD 树一次查询得到。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if n <= emb_dim + 1:
+        return np.nan
+    if tolerance is None:
+        tolerance = 0.2 * np.std(x)
+
+    from scipy.spatial import cKDTree
+    phi = []
+    for dim in (emb_dim, emb_dim + 1):
+        templates = _embed(x, dim)
+        tree = cKDTree(templates)
+        counts = tree.query_ball_point(templates, tolerance, p=np.inf, return_length=True)
+        phi.append(np.mean(np.log(counts / len(templates))))
+    return phi[0] - phi[1]
+
+
+def _dfa_fluctuation(profile, scale):
+    """
+    一个尺度下的 DFA 波动函数 F(n)：不重叠分箱，每箱一次线性去趋势。
+    箱内的最小二乘残差由箱内 Σy、Σy²、Σky 的闭式解得到，不逐箱 polyfit。
+    """
+    n_boxes = len(profile) // scale
+    boxes = profile[:n_boxes * scale].reshape(n_boxes, scale)
+    k = np.arange(scale, dtype=np.float64)
+    sk, skk = k.sum(), (k ** 2).sum()
+    sy = boxes.sum(axis=1)
+    syy = (boxes ** 2).sum(axis=1)
+    sky = boxes @ k
+    residual = syy - sy ** 2 / scale - (sky - sk * sy / scale) ** 2 / (skk - sk ** 2 / scale)
+    return np.sqrt(np.maximum(residual, 0.0).sum() / (n_boxes * scale))
+
+
+def dfa_alpha(x, scales):
+    """
+    去趋势波动分析的标度指数：log F(n) 对 log n 的斜率。少于 2 个可用尺度时为 NaN。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    profile = np.cumsum(x - x.mean())
+    scales = [s for s in scales if len(profile) // s >= 2]
+    if len(scales) < 2:
+        return np.nan
+    fluct = np.array([_dfa_fluctuation(profile, s) for s in scales])
+    if np.any(fluct <= 0):
+        return np.nan
+    return np.polyfit(np.log(scales), np.log(fluct), 1)[0]
+
+
+def _window_sampen_shared(rr, lo, hi, emb_dim, tolerance):
+    """
+    固定 tolerance 时的滑窗样本熵：整晚只用一次 KD 树找出所有匹配模板对（限定下标差小于最大窗口），
+    每个窗口的匹配数由对下标的 searchsorted 前缀计数得到，重叠窗口共享同一份匹配对。
+    下标差的限制通过给模板追加一维 i*tolerance/(L-0.5) 实现：切比雪夫距离 < tolerance 即同时要求 |i-j| < L。
+    """
+    n_windows = len(lo)
+    out = np.full(n_windows, np.nan)
+    t_lo = lo
+    t_hi = np.maximum(hi - emb_dim, lo)  # 窗口内模板下标范围 [t_lo, t_hi)，与 sample_entropy 相同取前 N-emb_dim 个
+    max_templates = int((t_hi - t_lo).max()) if n_windows else 0
+    n_templates = len(rr) - emb_dim
+    if max_templates < 2 or n_templates < 2:
+        return out
+
+    from scipy.spatial import cKDTree
+    radius = np.nextafter(tolerance, 0)
+    scale = tolerance / (max_templates - 0.5)
+    lag_axis = np.arange(n_templates, dtype=np.float64)[:, None] * scale
+
+    counts = []
+    for dim in (emb_dim, emb_dim + 1):
+        templates = np.hstack([_embed(rr, dim)[:n_templates], lag_axis])
+        pairs = cKDTree(templates).query_pairs(radius, p=np.inf, output_type='ndarray').reshape(-1, 2)
+        pair_i, pair_j = pairs.min(axis=1), pairs.max(axis=1)
+        order = np.argsort(pair_i, kind='stable')
+        i, j_sorted_by_i = pair_i[order], pair_j[order]
+        j = np.sort(pair_j)
+
+        # 窗口内匹配数 = #{j < t_hi} - #{i < t_lo} + #{i < t_lo 且 j >= t_hi}（最后一项只在较短窗口出现）
+        count = np.searchsorted(j, t_hi) - np.searchsorted(i, t_lo)
+        for w in np.flatnonzero(t_hi - t_lo < max_templates):
+            a = np.searchsorted(i, t_hi[w] - max_templates)
+            b = np.searchsorted(i, t_lo[w])
+            count[w] += np.count_nonzero(j_sorted_by_i[a:b] >= t_hi[w])
+        counts.append(count)
+
+    valid = (hi - lo) > emb_dim + 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[valid] = -np.log(counts[1][valid] / counts[0][valid])
+    out[valid & (counts[1] == 0)] = np.inf
+    return out
+
+
+def window_nonlinear(rr_intervals_ms, lo, hi, emb_dim=2, tolerance=None, apen=True, dfa=True):
+    """
+    批量计算所有窗口的非线性 HRV 特征。窗口由 RR 间期下标范围 [lo, hi) 给出。
+
+    参数:
+        rr_intervals_ms : ndarray  整段 RR 间期 (ms)
+        lo, hi : ndarray           每个窗口的下标范围
+        emb_dim : int              嵌入维数
+        tolerance : float | None   熵的容差 (ms)。给定固定值时，整晚的匹配模板对只找一次，
+                                   所有窗口共享；为 None 时每个窗口用 0.2*std（同 nolds），逐窗 KD 树计数
+        apen, dfa : bool           是否计算近似熵、DFA
+
+    返回:
+        dict  {'sampen', 'apen', 'dfa_alpha1', 'dfa_alpha2': ndarray}
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    n_windows = len(lo)
+    features = {key: np.full(n_windows, np.nan) for key in ('sampen', 'apen', 'dfa_alpha1', 'dfa_alpha2')}
+
+    if tolerance is not None:
+        features['sampen'] = _window_sampen_shared(rr, lo, hi, emb_dim, tolerance)
+
+    for w in range(n_windows):
+        segment = rr[lo[w]:hi[w]]
+        if len(segment) <= emb_dim + 1:
+            continue
+        if tolerance is None:
+            features['sampen'][w] = sample_entropy(segment, emb_dim)
+        if apen:
+            features['apen'][w] = approximate_entropy(segment, emb_dim, tolerance)
+        if dfa:
+            features['dfa_alpha1'][w] = dfa_alpha(segment, DFA_SHORT_SCALES)
+            features['dfa_alpha2'][w] = dfa_alpha(segment, DFA_LONG_SCALES)
+    return features
@@ -0,0 +1,156 @@
+# function: 基于 R 峰序列的滑窗划分（检测一次，窗口只在峰索引数组上切片）
+# author: Zhangsong
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+TAIL_POLICIES = ('drop', 'partial', 'align_end')
+
+
+def window_bounds(n_samples, sampling_rate, window_minutes=5, step_seconds=30, tail='drop',
+                  min_tail_fraction=0.5):
+    """
+    计算固定窗口、固定步长滑窗的起止采样点。
+
+    参数:
+        n_samples : int        数据长度（采样点数）
+        sampling_rate : float  采样率
+        window_minutes : float 时间窗（分钟）
+        step_seconds : float   步长（秒）
+        tail : str             末尾不足一个窗口的数据如何处理：
+                               'drop'      只保留完整窗口（以往的行为，末尾数据不参与计算）
+                               'partial'   按步长继续取窗口，终点截断到数据末尾，
+                                           长度不足 min_tail_fraction × 窗口长度的丢弃
+                               'align_end' 末尾补一个终点正好在数据末尾的完整窗口（该窗口步长不规则）
+        min_tail_fraction : float  'partial' 时尾部窗口的最短长度（占窗口长度的比例）
+
+    返回:
+        starts, ends : ndarray(int64)  每个窗口的起点和终点（不包含）
+    """
+    if tail not in TAIL_POLICIES:
+        raise ValueError(f"tail 必须是 {TAIL_POLICIES} 之一，实际为 {tail!r}")
+    window_len = int(window_minutes * 60 * sampling_rate)  # 窗口大小
+    step_len = int(step_seconds * sampling_rate)           # 步长大小
+    n_windows = max((n_samples - window_len) // step_len + 1, 0)
+
+    starts = np.arange(n_windows, dtype=np.int64) * step_len
+    ends = starts + window_len
+
+    if tail == 'partial':
+        tail_starts = np.arange(n_windows * step_len, n_samples, step_len, dtype=np.int64)
+        tail_ends = np.minimum(tail_starts + window_len, n_samples)
+        keep = tail_ends - tail_starts >= min_tail_fraction * window_len
+        starts = np.concatenate([starts, tail_starts[keep]])
+        ends = np.concatenate([ends, tail_ends[keep]])
+    elif tail == 'align_end' and n_samples >= window_len and (n_windows == 0 or ends[-1] < n_samples):
+        starts = np.append(starts, np.int64(n_samples - window_len))
+        ends = np.append(ends, np.int64(n_samples))
+    return starts, ends
+
+
+def window_times(starts, ends, sampling_rate, t0=0.0):
+    """
+    窗口起止采样点换算为时间戳（秒）。
+
+    参数:
+        starts, ends : ndarray  窗口起止采样点
+        sampling_rate : float   采样率
+        t0 : float              第 0 个采样点对应的时刻（秒），例如整晚记录中本段的起始时刻
+
+    返回:
+        start_times, end_times : ndarray(float64)
+    """
+    return t0 + np.asarray(starts) / sampling_rate, t0 + np.asarray(ends) / sampling_rate
+
+
+def ecg_windows(ecg_data, starts, ends):
+    """
+    按窗口起止点取心电片段，不复制数据。
+    窗口等长且步长一致时返回 sliding_window_view 的二维视图 (n_windows, window_len)，
+    否则（有截断尾窗或 align_end 补窗）返回各窗口切片视图的列表。
+
+    参数:
+        ecg_data : ndarray      心电数据（也可以是 memmap）
+        starts, ends : ndarray  window_bounds 的结果
+
+    返回:
+        ndarray(二维视图) 或 list[ndarray]，都可以用 segments[w] 取第 w 个窗口
+    """
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    if len(starts) == 0:
+        return []
+    lengths = ends - starts
+    steps = np.diff(starts)
+    if np.all(lengths == lengths[0]) and (len(steps) == 0 or np.all(steps == steps[0])):
+        step = int(steps[0]) if len(steps) else 1
+        view = sliding_window_view(ecg_data[starts[0]:ends[-1]], int(lengths[0]))
+        return view[::step]
+    return [ecg_data[start:end] for start, end in zip(starts, ends)]
+
+
+def beat_windows(values, n_beats, step_beats=1):
+    """
+    按心搏数划分的滑窗（例如每 300 个 RR 间期一个窗口），返回不复制数据的二维视图。
+
+    参数:
+        values : ndarray   RR 间期或 R 峰索引
+        n_beats : int      每个窗口的元素个数
+        step_beats : int   步长（元素个数）
+
+    返回:
+        ndarray  形状 (n_windows, n_beats) 的只读视图
+    """
+    values = np.asarray(values)
+    if len(values) < n_beats:
+        return values[:0].reshape(0, n_beats)
+    return sliding_window_view(values, n_beats)[::step_beats]
+
+
+def window_peak_ranges(rpeaks, starts, ends):
+    """
+    用 np.searchsorted 找出每个窗口在 R 峰数组中的下标范围 [lo, hi)。
+
+    参数:
+        rpeaks : ndarray       R 峰索引（升序）
+        starts, ends : ndarray 窗口起止采样点
+
+    返回:
+        lo, hi : ndarray(int64)  窗口内 R 峰在 rpeaks 中的下标范围，hi - lo 即心搏数
+    """
+    rpeaks = np.asarray(rpeaks, dtype=np.int64)
+    lo = np.searchsorted(rpeaks, starts, side='left')
+    hi = np.searchsorted(rpeaks, ends, side='left')
+    return lo, hi
+
+
+def window_rr_views(rr_intervals_ms, lo, hi):
+    """
+    由整段 RR 间期逐个取出各窗口的 RR（切片视图，不复制）。
+    窗口内第 lo..hi-1 个 R 峰对应 RR 下标 [lo, hi-1)。
+
+    参数:
+        rr_intervals_ms : ndarray  整段 RR 间期 (ms)，即 np.diff(rpeaks) / fs * 1000
+        lo, hi : ndarray           window_peak_ranges 的结果
+
+    返回:
+        生成器，依次给出每个窗口的 RR 视图（窗口内少于 2 个峰时为空）
+    """
+    for a, b in zip(lo, hi):
+        yield rr_intervals_ms[a:max(b - 1, a)]
+
+
+def window_rr_intervals(rpeaks, lo, hi, sampling_rate):
+    """
+    取出单个窗口内的 RR 间期 (ms)。
+
+    参数:
+        rpeaks : ndarray       R 峰索引
+        lo, hi : int           该窗口在 rpeaks 中的下标范围
+        sampling_rate : float  采样率
+
+    返回:
+        ndarray  RR 间期 (ms)，窗口内少于 2 个峰时为空数组
+    """
+    rpeaks_times = np.asarray(rpeaks[lo:hi]) / sampling_rate
+    return np.diff(rpeaks_times) * 1000
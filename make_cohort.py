@@ -0,0 +1,229 @@
+# function: 生成与真实数据目录结构一致的合成队列，用于在没有患者数据的机器上对批处理脚本做端到端计时和扩展性测试：
+#           HDF5 .mat（Totol_data，心电在第7列）、带 'ECG' 通道的 EDF、points_mark.txt（12/14/15 标签）、
+#           pairs_path_2.json 以及 txt2csv.py 使用的睡眠分期 .txt
+# author: Zhangsong
+
+# 用法:
+#   python make_cohort.py /data/cohort --subjects 20 --hours 8 --workers 4
+#   python make_cohort.py /tmp/cohort --subjects 3 --hours 0.5 --formats mat
+# 生成的目录:
+#   EEG_data/SLP001_base_eeg_data.mat, SLP001_up_eeg_data.mat, SLP001_down_eeg_data.mat   (resolve_eeg_mat_path 的命名)
+#   EDF/SLP001_Day1.edf, SLP001_Day2.edf, ...
+#   markers/SLP001_Day2_up/23点54分/points_mark.txt
+#   hypnogram/Up_SLP001.txt                     (Day2_up 夜的睡眠分期，txt2csv.py 的输入)
+#   pairs_path_2.json                           ({"SLP001_Day2_up": [[开始样本, 结束样本], ...], ...})
+#   truth/SLP001_Day2_up.rpeaks.npy             (R 峰真值，采样率为 .mat 的 1000 Hz)
+#   cohort.json                                 (生成参数与各记录的心率、HRV、文件路径)
+# 之后把 auto_sdnn_rmssd_demo.py 中的 pairs_dictionary / mat_sourceFolder 指向这里即可跑批处理。
+
+import argparse
+import json
+import os
+import time
+
+import h5py
+import numpy as np
+
+from hrv_core import resolve_eeg_mat_path
+from batch_runner import run_tasks
+from ecg_io import EDF_ECG_CHANNEL, MAT_DATASET, MAT_ECG_CHANNEL, MAT_SAMPLING_RATE
+from synthetic_ecg import simulate_ecg
+
+SESSIONS = ('Day1', 'Day2_up', 'Day3_down')   # 基线夜、上调刺激夜、下调刺激夜
+MAT_CHANNELS = 8                              # Totol_data 的列数，心电在 MAT_ECG_CHANNEL 列，其余列为 EEG 样噪声
+STAGE_NAMES = ('Wake', 'NonREM1', 'NonREM2', 'NonREM3', 'REM')  # 与 txt2csv.py 的映射一致（0–4）
+EPOCH_SECONDS = 30
+MARKER_ON, MARKER_STIM, MARKER_OFF = 12, 14, 15
+
+
+def subject_id(n):
+    return f"SLP{n:03d}"
+
+
+def simulate_hypnogram(duration_seconds, rng, epoch_seconds=EPOCH_SECONDS):
+    """
+    按约 90 分钟的睡眠周期生成分期序列（每 30 s 一个值，0–4 对应 STAGE_NAMES）：
+    入睡前清醒，之后每个周期 N1 → N2 → N3 → N2 → REM，N3 逐周期缩短、REM 逐周期延长，偶有短暂觉醒。
+    """
+    n_epochs = int(duration_seconds // epoch_seconds)
+    minutes = lambda lo, hi: max(int(rng.uniform(lo, hi) * 60 / epoch_seconds), 1)
+    stages = [0] * minutes(5, 20)
+    cycle = 0
+    while len(stages) < n_epochs:
+        n3_weight = max(1.0 - 0.3 * cycle, 0.1)
+        stages += [1] * minutes(2, 7)
+        stages += [2] * minutes(10, 25)
+        stages += [3] * minutes(20 * n3_weight, 40 * n3_weight)
+        stages += [2] * minutes(5, 15)
+        stages += [4] * minutes(5 + 5 * cycle, 10 + 8 * cycle)
+        if rng.random() < 0.5:
+            stages += [0] * minutes(0.5, 3)
+        cycle += 1
+    return np.asarray(stages[:n_epochs], dtype=np.int8)
+
+
+def write_hypnogram(path, stages, epoch_seconds=EPOCH_SECONDS):
+    """
+    写成 "分期名\t开始秒\t结束秒" 的连续段（txt2csv.py 的输入格式）。
+    """
+    change = np.flatnonzero(np.diff(stages)) + 1
+    bounds = np.concatenate([[0], change, [len(stages)]])
+    with open(path, 'w', encoding='utf-8') as f:
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            f.write(f"{STAGE_NAMES[stages[a]]}\t{a * epoch_seconds:.1f}\t{b * epoch_seconds:.1f}\n")
+
+
+def stimulation_periods(stages, n_periods, rng, epoch_seconds=EPOCH_SECONDS, min_minutes=5, max_minutes=15):
+    """
+    在深睡（N2/N3）连续段中选出算法开启的时段，返回 [(开启 ms, 关闭 ms), ...]。
+    深睡段不够时在记录中均匀取不与已选时段重叠的位置补足。
+    """
+    deep = np.isin(stages, (2, 3)).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], deep, [0]])))
+    runs = [(a, b) for a, b in zip(edges[::2], edges[1::2]) if (b - a) * epoch_seconds >= min_minutes * 60]
+    periods = []
+    for a, b in runs[:n_periods]:
+        on = (a + 2) * epoch_seconds
+        off = min(b * epoch_seconds, on + rng.uniform(min_minutes, max_minutes) * 60)
+        periods.append((on * 1000.0, off * 1000.0))
+    total = len(stages) * epoch_seconds
+    for on in np.linspace(0, total, 2 * n_periods + 2)[1:-1]:
+        if len(periods) >= n_periods:
+            break
+        off = min(on + min_minutes * 60, total)
+        if all(off * 1000 < a or on * 1000 > b for a, b in periods):
+            periods.append((on * 1000.0, off * 1000.0))
+    return sorted(periods)
+
+
+def write_markers(path, periods, rng, stim_interval_seconds=(4.0, 10.0)):
+    """
+    写 points_mark.txt：每个时段开始为 12、结束为 15，中间按随机间隔插入刺激标签 14。
+    """
+    lines = []
+    for on_ms, off_ms in periods:
+        lines.append((on_ms, MARKER_ON))
+        t = on_ms + rng.uniform(*stim_interval_seconds) * 1000
+        while t < off_ms:
+            lines.append((t, MARKER_STIM))
+            t += rng.uniform(*stim_interval_seconds) * 1000
+        lines.append((off_ms, MARKER_OFF))
+    with open(path, 'w', encoding='utf-8') as f:
+        for t_ms, label in lines:
+            f.write(f"{int(round(t_ms))},{label}\n")
+
+
+def write_mat(path, ecg_data, rng, n_channels=MAT_CHANNELS, dtype=np.float32, chunk_rows=1 << 16,
+              compression=None, block_rows=1 << 22):
+    """
+    写 HDF5 .mat：数据集 Totol_data 形状为 (样本数, 通道数)，心电在 MAT_ECG_CHANNEL 列，按块写入控制内存。
+    """
+    n = len(ecg_data)
+    with h5py.File(path, 'w') as f:
+        dataset = f.create_dataset(MAT_DATASET, shape=(n, n_channels), dtype=dtype,
+                                   chunks=(min(chunk_rows, max(n, 1)), n_channels), compression=compression)
+        for start in range(0, n, block_rows):
+            end = min(start + block_rows, n)
+            block = (0.02 * rng.standard_normal((end - start, n_channels))).astype(dtype)
+            block[:, MAT_ECG_CHANNEL] = ecg_data[start:end]
+            dataset[start:end] = block
+
+
+def write_edf(path, ecg_data, sampling_rate):
+    """
+    写只含 'ECG' 通道的 EDF（mne 导出，单位换算为伏特）。
+    """
+    import mne
+    info = mne.create_info([EDF_ECG_CHANNEL], sampling_rate, ch_types=['ecg'])
+    raw = mne.io.RawArray(np.asarray(ecg_data, dtype=np.float64)[None, :] * 1e-3, info, verbose='ERROR')
+    mne.export.export_raw(path, raw, fmt='edf', overwrite=True, verbose='ERROR')
+
+
+def make_subject(out_dir, n, hours, seed, formats, edf_rate, n_periods, compression):
+    """
+    生成一个被试的全部记录（可在子进程中执行），返回该被试写入 cohort.json 的信息。
+    """
+    sid = subject_id(n)
+    rng = np.random.default_rng([seed, n])
+    heart_rate = rng.uniform(55, 75)
+    hrv_std_ms = rng.uniform(30, 70)
+    ectopic_fraction = rng.uniform(0, 0.01)
+    duration = hours * 3600
+    info = {'subject': sid, 'heart_rate': heart_rate, 'hrv_std_ms': hrv_std_ms,
+            'ectopic_fraction': ectopic_fraction, 'sessions': {}, 'pairs': {}}
+
+    for session in SESSIONS:
+        key = f"{sid}_{session}"
+        record_seed = int(rng.integers(2 ** 31))
+        stages = simulate_hypnogram(duration, rng)
+        periods = stimulation_periods(stages, n_periods, rng)
+
+        # 记录开始时刻（22:30–00:30）作为标签目录名，与真实数据的 "23点54分" 一致
+        start_minute = int(rng.integers(22 * 60 + 30, 24 * 60 + 30)) % (24 * 60)
+        marker_dir = os.path.join(out_dir, 'markers', key, f"{start_minute // 60}点{start_minute % 60}分")
+        os.makedirs(marker_dir, exist_ok=True)
+        write_markers(os.path.join(marker_dir, 'points_mark.txt'), periods, rng)
+        if session.endswith('_up'):
+            write_hypnogram(os.path.join(out_dir, 'hypnogram', f"Up_{sid}.txt"), stages)
+
+        ecg_data, rpeaks, _ = simulate_ecg(duration, MAT_SAMPLING_RATE, heart_rate, hrv_std_ms,
+                                           ectopic_fraction, seed=record_seed)
+        np.save(os.path.join(out_dir, 'truth', f"{key}.rpeaks.npy"), rpeaks)
+        files = {}
+        if 'mat' in formats:
+            files['mat'] = resolve_eeg_mat_path(key, os.path.join(out_dir, 'EEG_data'), verify_exists=False)
+            write_mat(files['mat'], ecg_data, rng, compression=compression)
+        if 'edf' in formats:
+            files['edf'] = os.path.join(out_dir, 'EDF', f"{sid}_{session.split('_')[0]}.edf")
+            edf_ecg = ecg_data
+            if edf_rate != MAT_SAMPLING_RATE:
+                from scipy.signal import resample_poly
+                edf_ecg = resample_poly(ecg_data, int(edf_rate), MAT_SAMPLING_RATE)
+            write_edf(files['edf'], edf_ecg, edf_rate)
+
+        info['pairs'][key] = [[int(on_ms / 1000 * MAT_SAMPLING_RATE), int(off_ms / 1000 * MAT_SAMPLING_RATE)]
+                              for on_ms, off_ms in periods]
+        info['sessions'][key] = {'files': files, 'beats': len(rpeaks), 'samples': len(ecg_data)}
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成队列（.mat / EDF / 标签 / 配对 / 睡眠分期）")
+    parser.add_argument('out_dir')
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--hours', type=float, default=8.0, help="每晚记录时长（小时）")
+    parser.add_argument('--formats', nargs='*', default=['mat', 'edf'], choices=['mat', 'edf'])
+    parser.add_argument('--edf-rate', type=float, default=500.0, help="EDF 心电采样率")
+    parser.add_argument('--periods', type=int, default=2, help="每晚算法开启时段数（即配对数）")
+    parser.add_argument('--compression', default=None, help="HDF5 压缩（如 gzip），默认不压缩")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help="并行生成的进程数")
+    args = parser.parse_args()
+
+    for folder in ('EEG_data', 'EDF', 'markers', 'hypnogram', 'truth'):
+        os.makedirs(os.path.join(args.out_dir, folder), exist_ok=True)
+
+    t0 = time.perf_counter()
+    tasks = {subject_id(n): (args.out_dir, n, args.hours, args.seed, args.formats, args.edf_rate,
+                             args.periods, args.compression)
+             for n in range(1, args.subjects + 1)}
+    results = run_tasks(make_subject, tasks, args.workers)
+
+    pairs = {}
+    for sid in tasks:  # 按被试顺序写出，与真实 pairs_path_2.json 的顺序一致
+        if results[sid] is not None:
+            pairs.update(results[sid].pop('pairs'))
+    pairs_path = os.path.join(args.out_dir, 'pairs_path_2.json')
+    with open(pairs_path, 'w', encoding='utf-8') as f:
+        json.dump(pairs, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(args.out_dir, 'cohort.json'), 'w', encoding='utf-8') as f:
+        json.dump({'settings': vars(args), 'subjects': [results[sid] for sid in tasks]}, f,
+                  ensure_ascii=False, indent=2)
+
+    print(f"生成 {args.subjects} 名被试用时 {time.perf_counter() - t0:.1f} s")
+    print(f"pairs_dictionary = {os.path.abspath(pairs_path)!r}")
+    print(f"mat_sourceFolder = {os.path.abspath(os.path.join(args.out_dir, 'EEG_data'))!r}")
+
+
+if __name__ == "__main__":
+    main()
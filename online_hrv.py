@@ -0,0 +1,258 @@
+# function: 在线逐搏 HRV：按小块接收心电，因果地检测 R 峰，每个心搏 O(1) 更新 SDNN/RMSSD/心率，并统计延迟
+# author: Zhangsong
+
+import time
+from collections import deque
+
+import numpy as np
+from scipy import signal
+
+
+class RollingHRV:
+    """
+    最近 window_seconds 内 RR 间期的滚动 SDNN / RMSSD / 平均心率。
+    每加入一个 RR 只做常数次加减（移出的 RR 同样减去），累加和每 recompute_every 次重新精确求和一次，
+    防止整晚累积舍入误差（均摊仍为 O(1)）。定义与 hrvanalysis 相同：SDNN 为 ddof=1，
+    RMSSD 为逐差平方均值开方，mean_hr 为 60000/RR 的均值。
+    """
+
+    def __init__(self, window_seconds=300, low_rri=300, high_rri=2000, recompute_every=10000):
+        self.window_ms = window_seconds * 1000
+        self.low_rri = low_rri
+        self.high_rri = high_rri
+        self.recompute_every = recompute_every
+        self.rr = deque()
+        self.ref = None          # 累加前减去的参考值，减小大数相减的误差
+        self.sum_rr = 0.0        # Σ(rr - ref)
+        self.sum_rr2 = 0.0       # Σ(rr - ref)²
+        self.sum_diff2 = 0.0     # Σ 相邻 RR 逐差²（窗口内）
+        self.sum_hr = 0.0        # Σ 60000/rr
+        self.total_ms = 0.0      # 窗口内 RR 总时长
+        self._n_updates = 0
+
+    def _recompute(self):
+        rr = np.asarray(self.rr, dtype=np.float64)
+        self.ref = rr.mean() if len(rr) else self.ref
+        centered = rr - self.ref
+        self.sum_rr = centered.sum()
+        self.sum_rr2 = (centered ** 2).sum()
+        self.sum_diff2 = (np.diff(rr) ** 2).sum()
+        self.sum_hr = (60000 / rr).sum()
+        self.total_ms = rr.sum()
+
+    def add(self, rr_ms):
+        """
+        加入一个 RR 间期 (ms)。生理范围外的 RR（同 remove_outliers）不计入，并返回 False。
+        """
+        if not (self.low_rri <= rr_ms <= self.high_rri):
+            return False
+        if self.ref is None:
+            self.ref = rr_ms
+
+        if self.rr:
+            self.sum_diff2 += (rr_ms - self.rr[-1]) ** 2
+        self.rr.append(rr_ms)
+        self.sum_rr += rr_ms - self.ref
+        self.sum_rr2 += (rr_ms - self.ref) ** 2
+        self.sum_hr += 60000 / rr_ms
+        self.total_ms += rr_ms
+
+        # 超出时间窗的 RR 从左侧移出
+        while self.total_ms > self.window_ms and len(self.rr) > 2:
+            old = self.rr.popleft()
+            self.sum_diff2 -= (self.rr[0] - old) ** 2
+            self.sum_rr -= old - self.ref
+            self.sum_rr2 -= (old - self.ref) ** 2
+            self.sum_hr -= 60000 / old
+            self.total_ms -= old
+
+        self._n_updates += 1
+        if self._n_updates % self.recompute_every == 0:
+            self._recompute()
+        return True
+
+    def metrics(self):
+        """
+        当前窗口的 {'sdnn', 'rmssd', 'mean_hr', 'n_rr'}，RR 少于 2 个时为 NaN。
+        """
+        n = len(self.rr)
+        if n < 2:
+            return {'sdnn': np.nan, 'rmssd': np.nan, 'mean_hr': np.nan, 'n_rr': n}
+        var = max(self.sum_rr2 - self.sum_rr ** 2 / n, 0.0) / (n - 1)
+        return {
+            'sdnn': np.sqrt(var),
+            'rmssd': np.sqrt(max(self.sum_diff2, 0.0) / (n - 1)),
+            'mean_hr': self.sum_hr / n,
+            'n_rr': n,
+        }
+
+
+class CausalRPeakDetector:
+    """
+    因果（只用已到达样本）的 Pan-Tompkins 式 R 峰检测：
+    5–15 Hz 带通 → 五点微分 → 平方 → 150 ms 滑动积分，积分信号超过自适应阈值的区段结束时确认一个心搏，
+    再在原始心电最近一段内取最大值作为 R 峰位置。各级滤波都保存状态，按块输入与整段输入结果相同。
+    """
+
+    def __init__(self, sampling_rate, learn_seconds=2.0, refractory_seconds=0.25, buffer_seconds=2.0):
+        self.fs = float(sampling_rate)
+        self.sos = signal.butter(2, [5, 15], btype='band', fs=self.fs, output='sos')
+        self.sos_zi = np.zeros((self.sos.shape[0], 2))
+        self.diff_b = np.array([1, 2, 0, -2, -1]) * (self.fs / 8)
+        self.diff_zi = np.zeros(len(self.diff_b) - 1)
+        self.mwi_len = max(int(0.15 * self.fs), 1)
+        self.mwi_b = np.ones(self.mwi_len) / self.mwi_len
+        self.mwi_zi = np.zeros(self.mwi_len - 1)
+
+        self.learn_len = int(learn_seconds * self.fs)
+        self.refractory = int(refractory_seconds * self.fs)
+        self.search_len = self.mwi_len + int(0.05 * self.fs)  # 积分峰之前回溯找 R 峰的长度
+
+        self.n_seen = 0                     # 已处理的样本数（下一个样本的绝对索引）
+        self.raw_buffer = deque(maxlen=int(buffer_seconds * self.fs))
+        self.learn_values = []
+        self.spki = None                    # 信号峰估计
+        self.npki = None                    # 噪声峰估计
+        self.in_region = False
+        self.region_max = 0.0
+        self.region_idx = 0
+        self.last_peak = -10 ** 12
+
+    def _threshold(self):
+        return self.npki + 0.25 * (self.spki - self.npki)
+
+    def _locate_r(self, mwi_idx):
+        """
+        在积分峰之前 search_len 个原始样本内取最大值的位置（绝对索引）。
+        """
+        buffer_start = self.n_seen - len(self.raw_buffer)
+        lo = max(mwi_idx - self.search_len, buffer_start)
+        hi = min(mwi_idx + 1, self.n_seen)
+        if hi <= lo:
+            return mwi_idx
+        segment = np.fromiter((self.raw_buffer[i - buffer_start] for i in range(lo, hi)), dtype=np.float64)
+        return lo + int(np.argmax(segment))
+
+    def process(self, block):
+        """
+        输入一块新样本，返回本块中确认的 R 峰绝对索引列表和各自的确认样本索引。
+        """
+        block = np.asarray(block, dtype=np.float64)
+        filtered, self.sos_zi = signal.sosfilt(self.sos, block, zi=self.sos_zi)
+        deriv, self.diff_zi = signal.lfilter(self.diff_b, 1.0, filtered, zi=self.diff_zi)
+        mwi, self.mwi_zi = signal.lfilter(self.mwi_b, 1.0, deriv ** 2, zi=self.mwi_zi)
+
+        peaks = []
+        for k, value in enumerate(mwi):
+            idx = self.n_seen
+            self.raw_buffer.append(block[k])
+            self.n_seen += 1
+
+            # 学习阶段：只统计积分信号，初始化阈值
+            if self.spki is None:
+                self.learn_values.append(value)
+                if len(self.learn_values) >= self.learn_len:
+                    learn = np.asarray(self.learn_values)
+                    self.spki = learn.max() / 3
+                    self.npki = learn.mean() / 2
+                    self.learn_values = []
+                continue
+
+            threshold = self._threshold()
+            if value > threshold:
+                if not self.in_region or value > self.region_max:
+                    self.region_max, self.region_idx = value, idx
+                self.in_region = True
+            elif self.in_region:
+                # 超阈值区段结束：确认心搏或记为噪声
+                self.in_region = False
+                r_idx = self._locate_r(self.region_idx)
+                if r_idx - self.last_peak >= self.refractory:
+                    self.spki = 0.125 * self.region_max + 0.875 * self.spki
+                    self.last_peak = r_idx
+                    peaks.append((r_idx, idx))
+                else:
+                    self.npki = 0.125 * self.region_max + 0.875 * self.npki
+        return peaks
+
+
+class OnlineHRV:
+    """
+    在线 HRV 引擎：push 一块心电 → 因果检测 R 峰 → 每个新心搏更新滚动 HRV。
+    每次更新都记录延迟：从该 R 峰所在样本块到达，到指标更新完成的墙钟时间；
+    以及算法延迟：确认心搏的样本与 R 峰样本之间的时间差。
+    """
+
+    def __init__(self, sampling_rate, window_seconds=300, **detector_kwargs):
+        self.fs = float(sampling_rate)
+        self.detector = CausalRPeakDetector(sampling_rate, **detector_kwargs)
+        self.hrv = RollingHRV(window_seconds)
+        self.last_peak = None
+        self.block_arrivals = deque()  # (块起始样本索引, 到达时间)
+        self.latencies = []
+        self.algorithmic_delays = []
+
+    def _arrival_of(self, sample_idx):
+        """
+        查找包含 sample_idx 的样本块的到达时间。
+        """
+        arrival = None
+        for start, t in self.block_arrivals:
+            if start > sample_idx:
+                break
+            arrival = t
+        return arrival
+
+    def push(self, block, arrival_time=None):
+        """
+        输入一块心电样本。
+
+        参数:
+            block : ndarray        新到达的样本
+            arrival_time : float   样本块到达时刻（time.perf_counter 时间），默认取调用时刻
+
+        返回:
+            list[dict]  本块中每个新心搏的 {'peak', 'time', 'rr', 'sdnn', 'rmssd', 'mean_hr', 'n_rr',
+                        'latency_s', 'delay_s'}
+        """
+        if arrival_time is None:
+            arrival_time = time.perf_counter()
+        self.block_arrivals.append((self.detector.n_seen, arrival_time))
+
+        updates = []
+        for r_idx, confirm_idx in self.detector.process(block):
+            rr = np.nan
+            if self.last_peak is not None:
+                rr = (r_idx - self.last_peak) / self.fs * 1000
+                self.hrv.add(rr)
+            self.last_peak = r_idx
+
+            update = {'peak': r_idx, 'time': r_idx / self.fs, 'rr': rr}
+            update.update(self.hrv.metrics())
+            arrival = self._arrival_of(r_idx)
+            update['latency_s'] = time.perf_counter() - arrival if arrival is not None else np.nan
+            update['delay_s'] = (confirm_idx - r_idx) / self.fs
+            self.latencies.append(update['latency_s'])
+            self.algorithmic_delays.append(update['delay_s'])
+            updates.append(update)
+
+        # 只保留检测器缓冲区仍可能回溯到的样本块
+        oldest = self.detector.n_seen - len(self.detector.raw_buffer)
+        while len(self.block_arrivals) > 1 and self.block_arrivals[1][0] <= oldest:
+            self.block_arrivals.popleft()
+        return updates
+
+    def latency_stats(self):
+        """
+        延迟统计（秒）：墙钟延迟和算法延迟的中位数、95 分位、最大值。
+        """
+        stats = {}
+        for name, values in (('latency', self.latencies), ('delay', self.algorithmic_delays)):
+            values = np.asarray(values, dtype=np.float64)
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+            stats[f'{name}_median'] = float(np.median(values))
+            stats[f'{name}_p95'] = float(np.percentile(values, 95))
+            stats[f'{name}_max'] = float(values.max())
+        return stats
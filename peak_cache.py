@@ -0,0 +1,118 @@
+# function: R 峰检测结果的磁盘缓存，按 源文件哈希 + 采样区间 + 检测器 + 预处理参数 建索引
+#           （源文件哈希按 大小+修改时间 记录在缓存目录中，文件不变时不重新读取）
+# author: Zhangsong
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from rpeak_detect import get_detector
+
+PEAK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.hrv_peak_cache')  # 默认缓存目录
+_HASH_BLOCK = 1 << 24  # 计算文件哈希时每次读取 16 MB
+
+_file_hash_memo = {}  # (绝对路径, mtime_ns, size) -> sha1，同一进程内不重复读取磁盘记录
+
+
+def file_hash(path, cache_dir=PEAK_CACHE_DIR):
+    """
+    源文件内容的 sha1（分块读取整个文件）。
+    结果按 路径+大小+修改时间 记录在 <cache_dir>/sources/ 下，文件未变化时直接读取记录，
+    各进程、各次运行都不再重新读取源文件；文件变化（大小或修改时间不同）后重新计算。
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime_ns, stat.st_size)
+    if memo_key in _file_hash_memo:
+        return _file_hash_memo[memo_key]
+
+    record_path = os.path.join(cache_dir, 'sources',
+                               hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json')
+    try:
+        with open(record_path, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        record = {}
+    if (record.get('source_path') == path and record.get('source_size') == stat.st_size
+            and record.get('source_mtime_ns') == stat.st_mtime_ns):
+        _file_hash_memo[memo_key] = record['sha1']
+        return record['sha1']
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            h.update(block)
+    record = {'source_path': path, 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns,
+              'sha1': h.hexdigest()}
+    os.makedirs(os.path.dirname(record_path), exist_ok=True)
+    tmp_path = f'{record_path}.{os.getpid()}.tmp'  # 多进程同时生成时互不覆盖
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, record_path)
+    _file_hash_memo[memo_key] = record['sha1']
+    return record['sha1']
+
+
+def peak_cache_key(source_hash, start, end, detector, params):
+    """
+    由 源文件哈希、采样区间、检测器名称和预处理参数 生成缓存键。任何一项变化都会得到新的键（旧条目失效）。
+    """
+    key = {
+        'source': source_hash,
+        'start': int(start),
+        'end': None if end is None else int(end),
+        'detector': detector,
+        'params': params or {},
+    }
+    text = json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def cached_rpeaks(source_path, ecg_data, sampling_rate, start=0, end=None,
+                  detector='neurokit', params=None, detect_fn=None, cache_dir=PEAK_CACHE_DIR):
+    """
+    带磁盘缓存的 R 峰检测。命中时直接返回保存的峰索引，未命中时检测一次并写入缓存。
+
+    参数:
+        source_path : str      源文件路径（.mat / .edf），用于计算文件哈希
+        ecg_data : ndarray     源文件心电 [start:end] 区间的数据（可以是滤波后的数据）
+        sampling_rate : float  采样率
+        start, end : int       ecg_data 在源文件中的采样区间，end 为 None 表示到末尾
+        detector : str         检测器名称
+        params : dict | None   预处理参数，如 {'bandpass': (0.3, 70, 4)}，需可 JSON 序列化
+        detect_fn : callable   检测函数 detect_fn(ecg_data, sampling_rate) -> 峰索引，默认按 detector 名称从注册表中取
+        cache_dir : str        缓存目录
+
+    返回:
+        ndarray(int64)  R 峰索引（相对 ecg_data）
+    """
+    key = peak_cache_key(file_hash(source_path, cache_dir), start, end, detector, params)
+    npy_path = os.path.join(cache_dir, key + '.npy')
+    if os.path.isfile(npy_path):
+        return np.load(npy_path)
+
+    if detect_fn is None:
+        detect_fn = get_detector(detector)
+    rpeaks = np.asarray(detect_fn(ecg_data, sampling_rate), dtype=np.int64)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{npy_path}.{os.getpid()}.tmp'  # 多进程同时生成时互不覆盖
+    with open(tmp_path, 'wb') as f:
+        np.save(f, rpeaks)
+    os.replace(tmp_path, npy_path)
+
+    # 元数据仅供人工查看
+    meta = {
+        'source_path': os.path.abspath(source_path),
+        'start': int(start),
+        'end': None if end is None else int(end),
+        'sampling_rate': float(sampling_rate),
+        'detector': detector,
+        'params': params or {},
+        'n_peaks': int(len(rpeaks)),
+    }
+    with open(os.path.join(cache_dir, key + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+    return rpeaks
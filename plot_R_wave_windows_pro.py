@@ -2,22 +2,16 @@
 # author: -ZhangSong
 # time: 2025-11-08-0954
 
-import pandas as pd
-import os
-import mne
-import pandas as pd
 import matplotlib.pyplot as plt
-from ecgdetectors import Detectors
-import neurokit2 as nk
 import numpy as np
-from matplotlib.widgets import Slider
-from hrvanalysis  import get_time_domain_features, get_frequency_domain_features, get_poincare_plot_features
+from hrvanalysis import get_time_domain_features
 from hrvanalysis.preprocessing import (
     remove_outliers,
     remove_ectopic_beats,
     interpolate_nan_values
 )
-from scipy import signal
+from ecg_io import open_filtered_ecg
+from peak_cache import cached_rpeaks
 
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 优先使用的中文字体列表
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号（-）显示为方块的问题
@@ -26,13 +20,16 @@ plt.rcParams['axes.unicode_minus'] = False  # 解决负号（-）显示为方块
 # 1. 加载文件及初始化
 # ----------------------
 edf_file = "D:\\研究生\\project\\整晚心率分析\\SLP012_Day2_up\\23点54分\\SLP012_Day2.edf"
-raw = mne.io.read_raw_edf(edf_file, preload=True)
-# 获取所有通道数据 (data 是 numpy 数组, times 是时间轴)
-data, times = raw[:]
-#实验采样率
-sampling_rate = raw.info['sfreq']
+
+# 滤波参数
+lowcut = 0.3  # 低频截止频率 (Hz)
+highcut = 70  # 高频截止频率 (Hz)
+order = 4  # 滤波器阶数
+
+# 整晚心电按 EDF 的实际采样率只滤波一次（分块零相位），结果缓存到磁盘；
+# 各窗口直接从滤波后的整段信号中切片，没有逐窗滤波的边缘瞬态
+filtered_ecg, sampling_rate = open_filtered_ecg(edf_file, lowcut, highcut, order)
 print(sampling_rate)
-ecg_data = data[raw.ch_names.index('ECG'), :]
 
 # ----------------------
 # 2. 提取相关事件窗口的数据
@@ -65,66 +62,15 @@ def get_ecg_window(ecg_data: np.ndarray, sampling_rate: float, win_index: int) -
 
     return win_ecg_data
 
-win_index = 3
-win_ecg_data = get_ecg_window(ecg_data, sampling_rate, win_index)
-
-# ----------------------
-# （补）. 对数据进行滤波操作
-# ----------------------
-# 设计参数
-fs = 1000 # 采样频率 (Hz) - 根据你的实际数据调整
-lowcut = 0.3  # 低频截止频率 (Hz)
-highcut = 70  # 高频截止频率 (Hz)
-order = 4  # 滤波器阶数
-def design_bandpass_filter(lowcut, highcut, fs, order=4):
-    '''
-    设计IIR带通滤波器（Butterworth）,4阶
-    
-    参数:
-        lowcut: 低频截止频率
-        highcut: 高频截止频率
-        fs: 采样频率
-        order: 滤波器阶数
-    
-    返回:
-        b, a: 滤波器系数
-    '''
-    nyquist = 0.5 * fs
-    low = lowcut / nyquist
-    high = highcut / nyquist
-    
-    b, a = signal.butter(order, [low, high], btype='band')
-    return b, a
-
-def zero_phase_filter(data, b, a):
-    """
-    应用零相位IIR滤波
-    
-    参数:
-        data: 输入信号
-        b, a: 滤波器系数
-    
-    返回:
-        filtered_data: 零相位滤波后的信号
-    """
-    # 使用filtfilt实现零相位滤波（前向-后向滤波）
-    filtered_data = signal.filtfilt(b, a, data)
-    return filtered_data
-
-b, a = design_bandpass_filter(lowcut, highcut, fs, order)
-# 应用零相位滤波
-filtered_data = zero_phase_filter(win_ecg_data, b, a)
-
-
 # ----------------------
 # 3. 画出该数据窗口的R峰图
 # ----------------------
 '''
-signals, info = nk.ecg_peaks(win_ecg_data, sampling_rate=sampling_rate)
+signals, info = nk.ecg_peaks(filtered_data, sampling_rate=sampling_rate)
 rpeaks = info["ECG_R_Peaks"]
 plt.figure(figsize=(15,4))
-plt.plot(win_ecg_data, label="ECG")
-plt.plot(rpeaks, win_ecg_data[rpeaks], "ro", label="R peaks")
+plt.plot(filtered_data, label="ECG")
+plt.plot(rpeaks, filtered_data[rpeaks], "ro", label="R peaks")
 plt.title("R peak detection")
 plt.xlabel("Samples")
 plt.ylabel("Amplitude")
@@ -135,12 +81,13 @@ plt.show()
 win_list = [3, 17, 26, 55, 82,130, 149,150, 187, 208, 227, 221]
 #win_list = [187, 208, 227, 221]
 for win_index in win_list:
-    win_ecg_data = get_ecg_window(ecg_data, sampling_rate, win_index)
-    # 应用零相位滤波
-    filtered_data = zero_phase_filter(win_ecg_data, b, a)
+    filtered_data = get_ecg_window(filtered_ecg, sampling_rate, win_index)
 
-    signals, info = nk.ecg_peaks(filtered_data, sampling_rate=sampling_rate)
-    rpeaks = info["ECG_R_Peaks"]
+    win_start = win_index * int(60 * sampling_rate)
+    rpeaks = cached_rpeaks(edf_file, filtered_data, sampling_rate,
+                           win_start, win_start + len(filtered_data),
+                           params={'bandpass': (lowcut, highcut, order), 'fs': sampling_rate,
+                                   'filter': 'record_sosfiltfilt'})
     print(f"第{win_index}个窗口的心率为{len(rpeaks)}")
     plt.figure(figsize=(15,4))
     plt.plot(filtered_data, label="ECG")
@@ -0,0 +1,196 @@
+# function: 流程分阶段计时（墙钟/CPU 时间、样本数、心搏数、峰值内存）、按被试的 cProfile、JSON 运行报告和安静模式
+# author: Zhangsong
+
+# 用法:
+#   with stage('detect') as counts:
+#       rpeaks = detect_rpeaks(ecg, fs)
+#       counts['beats'] = len(rpeaks)
+#   ...
+#   save_report('run_report.json')
+# 多进程时由 batch_runner.run_tasks 把子进程的阶段统计带回主进程合并。
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+QUIET_ENV = 'HRV_QUIET'   # 安静模式通过环境变量传给子进程
+QUIET = os.environ.get(QUIET_ENV, '') == '1'
+
+_stages = {}      # 阶段名 -> {'calls', 'wall_s', 'cpu_s', 计数...}
+_worker_peak_rss_mb = 0.0
+
+
+def set_quiet(quiet=True):
+    """
+    打开/关闭安静模式：关闭逐窗口的打印（log），之后启动的子进程同样生效。
+    """
+    global QUIET
+    QUIET = bool(quiet)
+    os.environ[QUIET_ENV] = '1' if quiet else '0'
+
+
+def is_quiet():
+    """
+    当前是否为安静模式（第三方库的 verbose 参数据此设置）。
+    """
+    return QUIET
+
+
+def log(*args, **kwargs):
+    """
+    逐窗口等细节输出，安静模式下不打印。
+    """
+    if not QUIET:
+        print(*args, **kwargs)
+
+
+def peak_rss_mb():
+    """
+    当前进程的峰值常驻内存 (MB)；Linux/macOS 用 resource，Windows 用 psutil（未安装时返回 None）。
+    """
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024  # macOS 单位为字节，Linux 为 KB
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024 / 1024
+    except ImportError:
+        return None
+
+
+@contextmanager
+def stage(name, **counts):
+    """
+    记录一个阶段（load / filter / detect / clean / features / persist 等）的墙钟时间和 CPU 时间，
+    同名阶段多次调用时累加。counts 为初始计数（如 samples=len(ecg)），也可以在 with 块内往返回的字典里补充。
+    """
+    extra = dict(counts)
+    wall0 = time.perf_counter()
+    cpu0 = time.process_time()
+    try:
+        yield extra
+    finally:
+        record = _stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+        record['calls'] += 1
+        record['wall_s'] += time.perf_counter() - wall0
+        record['cpu_s'] += time.process_time() - cpu0
+        for key, value in extra.items():
+            record[key] = record.get(key, 0) + value
+
+
+def reset_stages():
+    global _worker_peak_rss_mb
+    _stages.clear()
+    _worker_peak_rss_mb = 0.0
+
+
+def stage_snapshot():
+    """
+    当前进程的阶段统计（可序列化，子进程返回给主进程用）。
+    """
+    return {'stages': {name: dict(record) for name, record in _stages.items()}, 'peak_rss_mb': peak_rss_mb()}
+
+
+def merge_stages(snapshot):
+    """
+    把子进程的阶段统计累加到本进程，子进程峰值内存取最大值。
+    """
+    global _worker_peak_rss_mb
+    for name, other in snapshot['stages'].items():
+        record = _stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+        for key, value in other.items():
+            record[key] = record.get(key, 0) + value
+    if snapshot.get('peak_rss_mb'):
+        _worker_peak_rss_mb = max(_worker_peak_rss_mb, snapshot['peak_rss_mb'])
+
+
+def call_with_stages(task_fn, *args):
+    """
+    在子进程中执行任务并附带本任务的阶段统计，返回 (结果, 阶段统计)。
+    """
+    reset_stages()
+    result = task_fn(*args)
+    return result, stage_snapshot()
+
+
+def stage_report(**extra):
+    """
+    汇总报告：各阶段耗时、计数和吞吐，主进程及子进程峰值内存，extra 中的运行信息原样写入。
+    """
+    stages = {}
+    for name, record in _stages.items():
+        item = dict(record)
+        if record['wall_s'] > 0:
+            for key in ('samples', 'beats', 'windows'):
+                if key in record:
+                    item[f'{key}_per_s'] = record[key] / record['wall_s']
+        stages[name] = item
+    report = {
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+        'worker_peak_rss_mb': _worker_peak_rss_mb or None,
+    }
+    report.update(extra)
+    return report
+
+
+def print_report(report=None):
+    """
+    打印各阶段耗时表（按墙钟时间从大到小）。
+    """
+    report = report if report is not None else stage_report()
+    print(f"{'阶段':<12} {'次数':>6} {'墙钟(s)':>10} {'CPU(s)':>10}  计数")
+    for name, record in sorted(report['stages'].items(), key=lambda kv: -kv[1]['wall_s']):
+        counts = ', '.join(f"{k}={v:.0f}" for k, v in record.items()
+                           if k not in ('calls', 'wall_s', 'cpu_s') and not k.endswith('_per_s'))
+        print(f"{name:<12} {record['calls']:>6} {record['wall_s']:>10.3f} {record['cpu_s']:>10.3f}  {counts}")
+    if report.get('peak_rss_mb') is not None:
+        print(f"峰值内存: 主进程 {report['peak_rss_mb']:.0f} MB", end='')
+        if report.get('worker_peak_rss_mb'):
+            print(f"，子进程最大 {report['worker_peak_rss_mb']:.0f} MB", end='')
+        print()
+
+
+def save_report(path, **extra):
+    """
+    把汇总报告写成 JSON 文件，返回报告字典。
+    """
+    report = stage_report(**extra)
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+@contextmanager
+def profiled(name, profile_dir=None, top=30):
+    """
+    profile_dir 不为 None 时用 cProfile 记录 with 块，保存为 <profile_dir>/<name>.prof（可用 snakeviz 等查看），
+    并写出按累计时间排序的前 top 个函数 <name>.txt。profile_dir 为 None 时不做任何事。
+    """
+    if profile_dir is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(name))
+        profiler.dump_stats(os.path.join(profile_dir, safe_name + '.prof'))
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(top)
+        with open(os.path.join(profile_dir, safe_name + '.txt'), 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
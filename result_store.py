@@ -0,0 +1,105 @@
+# function: 批处理结果的列式存储（HDF5），按 指标/工作表/列表头 追加，最后一次性导出 Excel
+# author: Zhangsong
+
+import os
+
+import h5py
+import numpy as np
+
+# 旧版结果 Excel 中的工作表名 -> 现在的名字（原脚本把第二个慢波的 SDNN 写到了拼错的 'secondtWave'，RMSSD 写到 'secondWave'）
+LEGACY_SHEET_NAMES = {'secondtWave': 'secondWave'}
+
+
+def _to_array(values):
+    """
+    把结果列表转换为 float64 数组，None 记为 NaN；无法转换时返回 None。
+    """
+    if values is None:
+        return None
+    try:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+
+
+def append_result(store_path, col_name, sheet_name, metrics):
+    """
+    追加一个被试/条件在某个工作表（慢波）下的结果，已存在的同名列会被覆盖。
+    每次只新增一个小数据集，不读写其他结果，代价与已保存的被试数无关。
+
+    参数:
+        store_path : str   HDF5 结果文件路径
+        col_name : str     列表头（如 '14_base'，即 被试编号_条件）
+        sheet_name : str   工作表名（如 'firstWave'）
+        metrics : dict     {指标名: 数值列表}，如 {'SDNN': [...], 'RMSSD': [...]}
+    """
+    with h5py.File(store_path, 'a', track_order=True) as f:
+        for metric, values in metrics.items():
+            data = _to_array(values)
+            if data is None:
+                print(f"⚠ 跳过写入列 {metric}/{sheet_name}/{col_name}，无法转换为数组")
+                continue
+            group = f.require_group(metric)
+            if sheet_name not in group:
+                group.create_group(sheet_name, track_order=True)
+            sheet = group[sheet_name]
+            if col_name in sheet:
+                del sheet[col_name]
+            sheet.create_dataset(col_name, data=data)
+
+
+def has_result(store_path, col_name, sheet_name, metric='SDNN'):
+    """
+    判断结果文件中是否已有该列（只读取 HDF5 索引，不读取数据）。
+    """
+    if not os.path.isfile(store_path):
+        return False
+    with h5py.File(store_path, 'r') as f:
+        return f'{metric}/{sheet_name}/{col_name}' in f
+
+
+def import_excel(store_path, metric, excel_path):
+    """
+    把已有的 Excel 结果（每个工作表第1行为表头、第2行起为数据）导入结果文件，用于从旧结果迁移。
+    旧的工作表名按 LEGACY_SHEET_NAMES 改为现在的名字，同一列在新旧两个工作表中都有时以新工作表为准。
+    """
+    if not os.path.isfile(excel_path):
+        return
+    import pandas as pd  # 只有导入/导出 Excel 时需要
+    sheets = pd.read_excel(excel_path, sheet_name=None, engine="openpyxl")
+    # 旧名工作表先写入，新名工作表后写入时覆盖同名列
+    for sheet_name, df in sorted(sheets.items(), key=lambda item: item[0] not in LEGACY_SHEET_NAMES):
+        sheet_name = LEGACY_SHEET_NAMES.get(sheet_name, sheet_name)
+        for col in df.columns:
+            values = df[col]
+            last = values.last_valid_index()  # 只去掉列尾留空的部分，中间的 NaN 保留
+            values = values.loc[:last] if last is not None else values.iloc[:0]
+            append_result(store_path, str(col), sheet_name, {metric: values.tolist()})
+
+
+def export_excel(store_path, metric, excel_path, columns=None):
+    """
+    把某个指标的全部结果一次性写成 Excel：每个工作表一份，每列一个被试/条件，长度不同的列下方留空。
+
+    参数:
+        store_path : str  HDF5 结果文件路径
+        metric : str      指标名（如 'SDNN'）
+        excel_path : str  导出的 Excel 路径（整体覆盖）
+        columns : list | None  列的先后顺序（如 pairs 字典的顺序），未列出的列按写入顺序排在后面；
+                  为 None 时按写入顺序
+    """
+    import pandas as pd
+    with h5py.File(store_path, 'r') as f:
+        if metric not in f:
+            return
+        sheets = {}
+        for sheet_name, sheet in f[metric].items():
+            names = list(sheet)
+            if columns is not None:
+                rank = {col: k for k, col in enumerate(columns)}
+                names.sort(key=lambda col: rank.get(col, len(rank)))  # 稳定排序，未列出的保持写入顺序
+            sheets[sheet_name] = pd.DataFrame({col: pd.Series(sheet[col][()]) for col in names})
+
+    with pd.ExcelWriter(excel_path, engine="openpyxl") as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
@@ -0,0 +1,409 @@
+# function: R 峰检测的公共入口，供各脚本共享（整段/整晚只检测一次、整晚分块检测）
+# author: Zhangsong
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# neurokit2（导入约 3 s）和 scipy.signal 在各检测函数中用到时才导入，只用缓存或 numpy 检测器的脚本启动不受影响
+
+# neurokit 的 R 峰方法；有同名清洗方法的先用同名方法清洗，其余用默认的 neurokit 清洗
+NK_PEAK_METHODS = ('neurokit', 'pantompkins1985', 'hamilton2002', 'elgendi2010', 'engzeemod2012',
+                   'kalidas2017', 'martinez2004', 'rodrigues2021', 'nabian2018')
+NK_CLEAN_METHODS = ('pantompkins1985', 'hamilton2002', 'elgendi2010', 'engzeemod2012')
+# ecgdetectors 中不需要额外模板文件的算法
+ECGDETECTORS_METHODS = ('pan_tompkins', 'hamilton', 'christov', 'engzee', 'swt', 'two_average', 'wqrs')
+
+
+def detect_rpeaks(ecg_data, sampling_rate):
+    """
+    对一段心电数据做一次 R 峰检测。
+
+    参数:
+        ecg_data : ndarray     心电数据
+        sampling_rate : float  采样率
+
+    返回:
+        ndarray(int64)  R 峰的采样点索引（升序）
+    """
+    import neurokit2 as nk
+    _, rpeak_info = nk.ecg_peaks(ecg_data, sampling_rate=sampling_rate)
+    return np.asarray(rpeak_info["ECG_R_Peaks"], dtype=np.int64)
+
+
+def detect_rpeaks_cleaned(ecg_data, sampling_rate):
+    """
+    先 nk.ecg_clean 再检测 R 峰（plot_R_wave.py / verify_R_wave.py 的做法）。
+    """
+    import neurokit2 as nk
+    ecg_cleaned = nk.ecg_clean(ecg_data, sampling_rate=sampling_rate)
+    return detect_rpeaks(ecg_cleaned, sampling_rate)
+
+
+def iter_rpeaks_chunked(ecg_data, sampling_rate, chunk_seconds=300, overlap_seconds=10,
+                        refractory_seconds=0.25, detect_fn=None):
+    """
+    分块检测 R 峰（生成器），内存只与块大小有关，与记录长度无关。
+    每块前后各多取 overlap_seconds 的数据，只保留落在本块核心区间内的峰；
+    跨块边界时，与上一个已输出峰相距小于 refractory_seconds 的峰视为重复并丢弃。
+
+    参数:
+        ecg_data : ndarray       整条心电（可以是 memmap，只按块读取）
+        sampling_rate : float    采样率
+        chunk_seconds : float    每块核心区间长度（秒）
+        overlap_seconds : float  每侧重叠长度（秒），用于消除滤波和检测的边缘效应
+        refractory_seconds : float  判定重复峰的最小间隔（秒）
+        detect_fn : callable     单块检测函数 detect_fn(block, sampling_rate)，默认 detect_rpeaks
+
+    返回:
+        生成器，每次产出一块内的 R 峰索引（相对整条记录，int64，升序）
+    """
+    if detect_fn is None:
+        detect_fn = detect_rpeaks
+    n_samples = len(ecg_data)
+    chunk_len = int(chunk_seconds * sampling_rate)
+    overlap = int(overlap_seconds * sampling_rate)
+    refractory = int(refractory_seconds * sampling_rate)
+    last_peak = None
+
+    for core_start in range(0, n_samples, chunk_len):
+        core_end = min(core_start + chunk_len, n_samples)
+        block_start = max(core_start - overlap, 0)
+        block_end = min(core_end + overlap, n_samples)
+        block = np.asarray(ecg_data[block_start:block_end], dtype=np.float64)
+
+        peaks = np.asarray(detect_fn(block, sampling_rate), dtype=np.int64) + block_start
+        peaks = peaks[(peaks >= core_start) & (peaks < core_end)]
+        if last_peak is not None:
+            peaks = peaks[peaks - last_peak >= refractory]
+        if len(peaks):
+            last_peak = peaks[-1]
+            yield peaks
+
+
+def detect_rpeaks_chunked(ecg_data, sampling_rate, **kwargs):
+    """
+    分块检测整条记录的 R 峰，参数同 iter_rpeaks_chunked，返回拼接后的峰索引数组。
+    """
+    blocks = list(iter_rpeaks_chunked(ecg_data, sampling_rate, **kwargs))
+    if not blocks:
+        return np.array([], dtype=np.int64)
+    return np.concatenate(blocks)
+
+
+def slice_rpeaks(rpeaks, start, end):
+    """
+    从整条记录的 R 峰序列中取出 [start, end) 区间内的峰，并换算为相对 start 的索引。
+
+    参数:
+        rpeaks : ndarray  整条记录的 R 峰索引（升序）
+        start, end : int  区间起止采样点
+
+    返回:
+        ndarray(int64)  区间内 R 峰相对 start 的索引
+    """
+    rpeaks = np.asarray(rpeaks, dtype=np.int64)
+    lo = np.searchsorted(rpeaks, start, side='left')
+    hi = np.searchsorted(rpeaks, end, side='left')
+    return rpeaks[lo:hi] - int(start)
+
+
+# ------------------------------------检测器注册表-------------------------------------------------------
+# 名称 -> detect_fn(ecg_data, sampling_rate)，返回 int64 的 R 峰索引；各脚本和分块检测都可按名称选用
+DETECTORS = {}
+
+
+def register_detector(name, detect_fn):
+    """
+    注册一个 R 峰检测器。detect_fn(ecg_data, sampling_rate) 需返回升序的 R 峰采样点索引。
+    """
+    DETECTORS[name] = detect_fn
+    return detect_fn
+
+
+def get_detector(name):
+    """
+    按名称取检测函数，名称不存在时列出可用的检测器。
+    """
+    if name not in DETECTORS:
+        raise KeyError(f"未知的 R 峰检测器 {name!r}，可用: {sorted(DETECTORS)}")
+    return DETECTORS[name]
+
+
+def _neurokit_detector(method):
+    clean_method = method if method in NK_CLEAN_METHODS else 'neurokit'
+
+    def detect(ecg_data, sampling_rate):
+        import neurokit2 as nk
+        ecg_cleaned = nk.ecg_clean(ecg_data, sampling_rate=sampling_rate, method=clean_method)
+        _, rpeak_info = nk.ecg_peaks(ecg_cleaned, sampling_rate=sampling_rate, method=method)
+        return np.asarray(rpeak_info["ECG_R_Peaks"], dtype=np.int64)
+    return detect
+
+
+def _ecgdetectors_detector(method):
+    def detect(ecg_data, sampling_rate):
+        from ecgdetectors import Detectors  # 可选依赖，用到时才导入
+        detector = getattr(Detectors(sampling_rate), f'{method}_detector')
+        return np.unique(np.asarray(detector(np.asarray(ecg_data, dtype=np.float64)), dtype=np.int64))
+    return detect
+
+
+def _moving_average(x, width):
+    """
+    居中的滑动平均（cumsum 实现，两端按实际点数平均）。
+    """
+    width = max(int(width), 1)
+    csum = np.concatenate([[0.0], np.cumsum(x)])
+    idx = np.arange(len(x))
+    lo = np.clip(idx - width // 2, 0, len(x))
+    hi = np.clip(idx - width // 2 + width, 0, len(x))
+    return (csum[hi] - csum[lo]) / (hi - lo)
+
+
+def _ranges(starts, ends):
+    """
+    拼接多个区间 [start, end) 的下标（向量化，不逐区间循环）。
+    """
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+def detect_rpeaks_numpy(ecg_data, sampling_rate, threshold_ratio=0.3, refractory_seconds=0.25):
+    """
+    纯 NumPy 的快速 R 峰检测（无逐样本 Python 循环）：
+    两个滑动平均之差做带通 → 微分平方 → 滑动积分 → 按 2 秒段峰值的局部中位数设自适应阈值，
+    超阈值区段内取带通信号最大值，再在原始心电 ±25 ms 内对齐到最大值，最后去掉不应期内较小的峰。
+
+    参数:
+        ecg_data : ndarray         心电数据
+        sampling_rate : float      采样率
+        threshold_ratio : float    阈值占局部峰值中位数的比例
+        refractory_seconds : float 两个 R 峰的最小间隔（秒）
+
+    返回:
+        ndarray(int64)  R 峰的采样点索引（升序）
+    """
+    fs = float(sampling_rate)
+    x = np.asarray(ecg_data, dtype=np.float64)
+    n = len(x)
+    if n < int(2 * fs):
+        return np.array([], dtype=np.int64)
+
+    # 约 5–20 Hz 的带通：30 ms 平均去高频噪声和工频（50 Hz 的整数倍被完全滤除），减去 100 ms 平均去基线和 P/T 波
+    band = _moving_average(x, 0.03 * fs) - _moving_average(x, 0.1 * fs)
+    energy = _moving_average(np.gradient(band) ** 2, 0.12 * fs)
+
+    # 自适应阈值：每 2 秒段的最大值，取前后各 5 段的中位数
+    seg = int(2 * fs)
+    n_seg = n // seg
+    seg_max = energy[:n_seg * seg].reshape(n_seg, seg).max(axis=1)
+    padded = np.pad(seg_max, 5, mode='edge')
+    local = np.median(sliding_window_view(padded, 11), axis=1)
+    threshold = np.repeat(local, seg)
+    threshold = np.concatenate([threshold, np.full(n - len(threshold), local[-1])]) * threshold_ratio
+
+    # 超阈值区段 → 区段内带通信号最大值的位置
+    above = np.concatenate([[False], energy > threshold, [False]])
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    region_starts, region_ends = edges[::2], edges[1::2]
+    if len(region_starts) == 0:
+        return np.array([], dtype=np.int64)
+    region_id = np.repeat(np.arange(len(region_starts)), region_ends - region_starts)
+    positions = _ranges(region_starts, region_ends)
+    region_max = np.maximum.reduceat(band[positions], np.r_[0, np.cumsum(region_ends - region_starts)[:-1]])
+    is_max = band[positions] == region_max[region_id]
+    _, first = np.unique(region_id[is_max], return_index=True)
+    peaks = positions[is_max][first]
+
+    # 在原始心电（去基线后）±25 ms 内对齐到最大值
+    radius = max(int(0.025 * fs), 1)
+    detrended = x - _moving_average(x, 0.2 * fs)
+    windows = np.clip(peaks[:, None] + np.arange(-radius, radius + 1), 0, n - 1)
+    peaks = windows[np.arange(len(peaks)), np.argmax(detrended[windows], axis=1)]
+    peaks = np.unique(peaks)
+
+    # 不应期：相邻两峰过近时去掉带通幅值较小的一个，直到没有过近的峰
+    refractory = int(refractory_seconds * fs)
+    while len(peaks) > 1:
+        close = np.flatnonzero(np.diff(peaks) < refractory)
+        if len(close) == 0:
+            break
+        drop = np.where(band[peaks[close]] < band[peaks[close + 1]], close, close + 1)
+        peaks = np.delete(peaks, np.unique(drop))
+    return peaks.astype(np.int64)
+
+
+def refine_rpeaks(ecg_data, rpeaks, sampling_rate, search_seconds=0.02, subsample=False, smooth_seconds=None):
+    """
+    在全分辨率心电上细化 R 峰位置：每个峰 ±search_seconds 内取最大值，
+    subsample=True 时再用三点抛物线插值得到亚采样点位置。
+    smooth_seconds 不为 None 时先做居中滑动平均再找最大值（20 ms 可滤除 50 Hz 工频及其谐波），
+    适合噪声较大、检测器本身在清洗后的信号上定位的情况。
+
+    参数:
+        ecg_data : ndarray        全采样率心电
+        rpeaks : ndarray          粗略的 R 峰位置（全采样率下的索引）
+        sampling_rate : float     全采样率
+        search_seconds : float    搜索半径（秒）
+        subsample : bool          是否返回亚采样点（float64）位置
+        smooth_seconds : float    细化前滑动平均的宽度（秒），None 时直接在原信号上找
+
+    返回:
+        ndarray  int64 索引，subsample=True 时为 float64 位置
+    """
+    x = np.asarray(ecg_data, dtype=np.float64)
+    if smooth_seconds:
+        x = _moving_average(x, smooth_seconds * sampling_rate)
+    rpeaks = np.asarray(rpeaks, dtype=np.int64)
+    n = len(x)
+    if len(rpeaks) == 0:
+        return rpeaks.astype(np.float64) if subsample else rpeaks
+    radius = max(int(search_seconds * sampling_rate), 1)
+    windows = np.clip(rpeaks[:, None] + np.arange(-radius, radius + 1), 0, n - 1)
+    peaks = windows[np.arange(len(rpeaks)), np.argmax(x[windows], axis=1)]
+    if not subsample:
+        return np.unique(peaks)
+
+    # 三点抛物线顶点：delta = (y[-1] - y[+1]) / (2 (y[-1] - 2 y[0] + y[+1]))，|delta| <= 0.5
+    inner = (peaks > 0) & (peaks < n - 1)
+    y0 = x[np.clip(peaks - 1, 0, n - 1)]
+    y1 = x[peaks]
+    y2 = x[np.clip(peaks + 1, 0, n - 1)]
+    denom = y0 - 2 * y1 + y2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(inner & (denom < 0), 0.5 * (y0 - y2) / denom, 0.0)
+    return np.unique(peaks + np.clip(delta, -0.5, 0.5))
+
+
+def detect_rpeaks_decimated(ecg_data, sampling_rate, target_rate=250, detect_fn=None, search_seconds=0.02,
+                            subsample=False, smooth_seconds=None):
+    """
+    降采样快速检测：先抗混叠降采样到约 target_rate（多相 FIR，零相位），在低采样率上检测 R 峰，
+    再回到全分辨率心电上局部搜索细化峰位置（见 refine_rpeaks）。
+    采样率本身不高于 target_rate 时直接检测。
+
+    参数:
+        ecg_data : ndarray        全采样率心电
+        sampling_rate : float     全采样率
+        target_rate : float       检测用的采样率
+        detect_fn : callable      检测函数 detect_fn(ecg, fs)，默认 detect_rpeaks
+        search_seconds : float    细化时的搜索半径（秒），应不小于一个降采样间隔
+        subsample : bool          是否返回亚采样点位置
+        smooth_seconds : float    细化前的滑动平均宽度（秒），见 refine_rpeaks
+
+    返回:
+        ndarray  全采样率下的 R 峰位置
+    """
+    if detect_fn is None:
+        detect_fn = detect_rpeaks
+    factor = int(round(sampling_rate / target_rate))
+    if factor <= 1:
+        peaks = np.asarray(detect_fn(ecg_data, sampling_rate), dtype=np.int64)
+        if subsample or smooth_seconds:
+            return refine_rpeaks(ecg_data, peaks, sampling_rate, search_seconds, subsample, smooth_seconds)
+        return peaks
+
+    from scipy import signal
+    x = np.asarray(ecg_data, dtype=np.float64)
+    decimated = signal.resample_poly(x, 1, factor)
+    coarse = np.asarray(detect_fn(decimated, sampling_rate / factor), dtype=np.int64) * factor
+    search_seconds = max(search_seconds, factor / sampling_rate)
+    return refine_rpeaks(x, coarse, sampling_rate, search_seconds, subsample, smooth_seconds)
+
+
+def rr_error_report(reference_peaks, test_peaks, sampling_rate, tolerance_seconds=0.15):
+    """
+    对比两组 R 峰（如全采样率检测与降采样检测）得到的 RR 间期误差。
+    只比较两端的峰都匹配上的 RR 间期。
+
+    参数:
+        reference_peaks : ndarray  参考 R 峰（全采样率检测结果）
+        test_peaks : ndarray       待评估的 R 峰（可以是亚采样点位置）
+        sampling_rate : float      采样率
+
+    返回:
+        dict  匹配结果（见 match_rpeaks）及 RR 误差的平均绝对值、均方根、最大值 (ms)，
+              以及整段 SDNN、RMSSD 的差值 (ms)
+    """
+    reference_peaks = np.asarray(reference_peaks, dtype=np.float64)
+    test_peaks = np.asarray(test_peaks, dtype=np.float64)
+    report = match_rpeaks(np.round(test_peaks).astype(np.int64), reference_peaks.astype(np.int64),
+                          sampling_rate, tolerance_seconds)
+
+    tolerance = tolerance_seconds * sampling_rate
+    if len(reference_peaks) < 2 or len(test_peaks) == 0:
+        return report
+    pos = np.clip(np.searchsorted(test_peaks, reference_peaks), 1, len(test_peaks) - 1) \
+        if len(test_peaks) > 1 else np.zeros(len(reference_peaks), dtype=np.int64)
+    if len(test_peaks) > 1:
+        left_closer = np.abs(reference_peaks - test_peaks[pos - 1]) <= np.abs(reference_peaks - test_peaks[pos])
+        pos = np.where(left_closer, pos - 1, pos)
+    matched = np.abs(reference_peaks - test_peaks[pos]) <= tolerance
+    # 相邻两个参考峰都匹配、且匹配到相邻的测试峰时，比较这一 RR 间期
+    pair = matched[:-1] & matched[1:] & (np.diff(pos) == 1)
+    rr_ref = np.diff(reference_peaks)[pair] / sampling_rate * 1000
+    rr_test = np.diff(test_peaks[pos])[pair] / sampling_rate * 1000
+    if len(rr_ref) == 0:
+        return report
+    error = rr_test - rr_ref
+    report.update({
+        'rr_compared': int(len(rr_ref)),
+        'rr_mae_ms': float(np.mean(np.abs(error))),
+        'rr_rmse_ms': float(np.sqrt(np.mean(error ** 2))),
+        'rr_max_error_ms': float(np.max(np.abs(error))),
+        'sdnn_diff_ms': float(np.std(rr_test, ddof=1) - np.std(rr_ref, ddof=1)) if len(rr_ref) > 1 else np.nan,
+        'rmssd_diff_ms': float(np.sqrt(np.mean(np.diff(rr_test) ** 2)) - np.sqrt(np.mean(np.diff(rr_ref) ** 2)))
+        if len(rr_ref) > 2 else np.nan,
+    })
+    return report
+
+
+register_detector('neurokit', detect_rpeaks)
+register_detector('neurokit_cleaned', detect_rpeaks_cleaned)
+for _method in NK_PEAK_METHODS:
+    register_detector(f'nk_{_method}', _neurokit_detector(_method))
+for _method in ECGDETECTORS_METHODS:
+    register_detector(f'ecgdet_{_method}', _ecgdetectors_detector(_method))
+register_detector('numpy', detect_rpeaks_numpy)
+register_detector('neurokit_250hz', lambda ecg_data, sampling_rate: detect_rpeaks_decimated(ecg_data, sampling_rate, 250))
+
+
+def match_rpeaks(detected, reference, sampling_rate, tolerance_seconds=0.15):
+    """
+    将检测结果与参考标注一一匹配（容差内最近的参考峰，每个参考峰最多匹配一次）。
+
+    参数:
+        detected, reference : ndarray  R 峰索引（升序）
+        sampling_rate : float          采样率
+        tolerance_seconds : float      匹配容差（秒），默认 150 ms
+
+    返回:
+        dict  {'tp', 'fp', 'fn', 'sensitivity', 'ppv', 'mean_abs_error_ms'}
+    """
+    detected = np.asarray(detected, dtype=np.int64)
+    reference = np.asarray(reference, dtype=np.int64)
+    tolerance = tolerance_seconds * sampling_rate
+    tp = 0
+    errors = np.array([])
+    if len(detected) and len(reference):
+        pos = np.clip(np.searchsorted(reference, detected), 1, len(reference) - 1)
+        left, right = reference[pos - 1], reference[pos]
+        nearest = np.where(np.abs(detected - left) <= np.abs(detected - right), pos - 1, pos)
+        if len(reference) == 1:
+            nearest = np.zeros(len(detected), dtype=np.int64)
+        dist = np.abs(detected - reference[nearest])
+        ok = dist <= tolerance
+        # 同一参考峰被多个检测峰命中时只保留距离最近的一个
+        order = np.lexsort((dist[ok], nearest[ok]))
+        matched_ref, first = np.unique(nearest[ok][order], return_index=True)
+        tp = len(matched_ref)
+        errors = dist[ok][order][first] / sampling_rate * 1000
+    fp = len(detected) - tp
+    fn = len(reference) - tp
+    return {
+        'tp': tp, 'fp': fp, 'fn': fn,
+        'sensitivity': tp / (tp + fn) if tp + fn else np.nan,
+        'ppv': tp / (tp + fp) if tp + fp else np.nan,
+        'mean_abs_error_ms': float(errors.mean()) if len(errors) else np.nan,
+    }
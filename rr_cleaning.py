@@ -0,0 +1,83 @@
+# function: 向量化的 RR 间期清理（整晚只做一次），与 hrvanalysis 的
+#           remove_outliers → remove_ectopic_beats(kamath) → interpolate_nan_values(linear) 等价
+# author: Zhangsong
+
+import numpy as np
+
+
+def remove_outliers_mask(rr_intervals_ms, low_rri=300, high_rri=2000):
+    """
+    生理范围外的 RR 间期（同 remove_outliers）。
+
+    返回:
+        ndarray(bool)  True 表示该 RR 间期为异常值
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return ~((rr >= low_rri) & (rr <= high_rri))
+
+
+def kamath_ectopic_mask(rr_intervals_ms):
+    """
+    Kamath 规则的异位心搏（同 remove_ectopic_beats(method="kamath")）：
+    第 i+1 个 RR 相对第 i 个增加超过 32.5% 或减少超过 24.5% 时判为异位；
+    被判为异位的下一个 RR 不再判断（hrvanalysis 中的 previous_outlier）。
+    含 NaN 的比较按不满足处理，与 hrvanalysis 一致。
+
+    返回:
+        ndarray(bool)  True 表示该 RR 间期被判为异位心搏
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    n = len(rr)
+    marked = np.zeros(n, dtype=bool)
+    if n < 2:
+        return marked
+
+    prev, nxt = rr[:-1], rr[1:]
+    with np.errstate(invalid='ignore'):
+        inc = nxt - prev
+        dec = prev - nxt
+        within = ((inc >= 0) & (inc <= 0.325 * prev)) | ((dec >= 0) & (dec <= 0.245 * prev))
+    flagged = ~within  # flagged[i]：第 i 个与第 i+1 个 RR 不满足规则
+
+    # 递推 marked[i+1] = flagged[i] and not marked[i]：在每一段连续 flagged 中，
+    # 从段首开始隔一个标记一个
+    idx = np.arange(n - 1)
+    run_start = np.where(flagged, 0, idx + 1)
+    run_start = np.maximum.accumulate(run_start)
+    marked[1:] = flagged & ((idx - run_start) % 2 == 0)
+    return marked
+
+
+def interpolate_nan_linear(rr_intervals_ms):
+    """
+    线性插值填补 NaN（同 interpolate_nan_values(interpolation_method="linear")）：
+    开头的 NaN 用第一个有效值填充，结尾的 NaN 用最后一个有效值填充。
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    valid = ~np.isnan(rr)
+    if valid.all() or not valid.any():
+        return rr.copy()
+    idx = np.arange(len(rr))
+    return np.interp(idx, idx[valid], rr[valid])
+
+
+def clean_rr_intervals(rr_intervals_ms, low_rri=300, high_rri=2000):
+    """
+    对整段 RR 间期一次性完成 去异常值 → Kamath 去异位心搏 → 线性插值。
+    之后各滑窗直接在清理后的序列上取下标范围计算特征，不必逐窗重复清理。
+    注意：逐窗清理时每个窗口的第一个 RR 总是保留，整段清理在窗口边界处可能与之略有不同。
+
+    参数:
+        rr_intervals_ms : ndarray  整段 RR 间期 (ms)
+        low_rri, high_rri : float  生理范围 (ms)
+
+    返回:
+        rr_clean : ndarray  清理并插值后的 RR 间期
+        valid_mask : ndarray(bool)  True 表示该心搏为原始值，False 表示被剔除后插值得到
+    """
+    rr = np.asarray(rr_intervals_ms, dtype=np.float64)
+    rr_outliers_removed = np.where(remove_outliers_mask(rr, low_rri, high_rri), np.nan, rr)
+    removed = np.isnan(rr_outliers_removed) | kamath_ectopic_mask(rr_outliers_removed)
+    rr_clean = interpolate_nan_linear(np.where(removed, np.nan, rr_outliers_removed))
+    return rr_clean, ~removed
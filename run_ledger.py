@@ -0,0 +1,86 @@
+# function: 批处理断点续跑台账（SQLite）：记录已完成的 (被试/条件, 第几个慢波, 参数哈希)，
+#           重启后直接跳过已完成的单元，参数或源文件变化的单元自动重做，不需要打开任何结果工作簿
+# author: Zhangsong
+
+# 每个单元先写入结果文件（result_store.append_result，同名列覆盖），再在台账中标记完成（单独一个事务）。
+# 中途崩溃时，已写入结果但未标记的单元下次会重做并覆盖，不会出现 SDNN 与 RMSSD 不一致的情况。
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def unit_params_hash(**params):
+    """
+    一个处理单元的参数哈希（参数按键排序后序列化），任何一项变化都会得到新的哈希。
+    """
+    text = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def source_signature(path):
+    """
+    源文件的廉价指纹（绝对路径、大小、修改时间），用于判断源文件是否被替换；不读取文件内容。
+    """
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class RunLedger:
+    """
+    SQLite 台账，每个 (unit, wave) 一行，保存最近一次完成时的参数哈希。
+    打开时把全部记录读入内存，is_done 为 O(1) 的字典查询。
+    """
+
+    def __init__(self, path):
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS units ('
+                ' unit TEXT NOT NULL, wave INTEGER NOT NULL, params TEXT NOT NULL,'
+                ' finished_at REAL NOT NULL, info TEXT,'
+                ' PRIMARY KEY (unit, wave))')
+        self._done = {(unit, wave): params
+                      for unit, wave, params in self.conn.execute('SELECT unit, wave, params FROM units')}
+
+    def __len__(self):
+        return len(self._done)
+
+    def is_done(self, unit, wave, params):
+        """
+        该单元是否已用相同参数完成。
+        """
+        return self._done.get((unit, int(wave))) == params
+
+    def mark_done(self, unit, wave, params, **info):
+        """
+        标记单元完成（覆盖旧参数的记录），info 为附带信息（如窗口数、耗时）。
+        """
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO units (unit, wave, params, finished_at, info) '
+                              'VALUES (?, ?, ?, ?, ?)',
+                              (unit, int(wave), params, time.time(), json.dumps(info, ensure_ascii=False)))
+        self._done[(unit, int(wave))] = params
+
+    def invalidate(self, unit=None, wave=None):
+        """
+        删除记录使其重做：unit 为 None 时清空全部，wave 为 None 时删除该单元的所有慢波。
+        """
+        with self.conn:
+            if unit is None:
+                self.conn.execute('DELETE FROM units')
+            elif wave is None:
+                self.conn.execute('DELETE FROM units WHERE unit = ?', (unit,))
+            else:
+                self.conn.execute('DELETE FROM units WHERE unit = ? AND wave = ?', (unit, int(wave)))
+        self._done = {key: params for key, params in self._done.items()
+                      if unit is not None and (key[0] != unit or (wave is not None and key[1] != int(wave)))}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,163 @@
+# function: 心电窗口信号质量的快速评估（平线、削波、幅度包络、峭度），质量不合格的窗口跳过 R 峰检测和 HRV 计算
+# author: Zhangsong
+
+import numpy as np
+
+# 各项指标的默认阈值（窗口需全部满足才算合格）
+QUALITY_THRESHOLDS = {
+    'flat_fraction': 0.1,       # 平线（电极脱落）时长占比上限
+    'clip_fraction': 0.01,      # 削波（放大器饱和，信号停在最大/最小值形成平台）的采样点占比上限
+    'artifact_fraction': 0.1,   # 幅度异常大（体动、电极接触不良）的时长占比上限
+    'envelope_low': 0.2,        # 窗口幅度包络 / 整条记录幅度包络 的下限
+    'envelope_high': 5.0,       # 上限
+    'kurtosis': 4.0,            # 去基线后峭度的下限（有清晰 QRS 的心电 140 bpm 时约 6，噪声和基线漂移接近 3）
+}
+# 峭度和幅度在减去滑动平均基线后的信号上计算（相当于高通），去掉呼吸、体位引起的基线漂移；
+# 原始心电上基线漂移会把峭度压到 3 附近。只用 numpy 的累加和实现，不需要导入 scipy.signal
+BASELINE_SECONDS = 1.0  # 约一个心搏
+
+
+def block_stats(ecg_data, sampling_rate, block_seconds=1.0, chunk_blocks=600, baseline_seconds=BASELINE_SECONDS):
+    """
+    一次遍历整条心电，按 block_seconds 分块计算各块的统计量，之后任意窗口只需对块做累加。
+    按 chunk_blocks 个块一批读取，可以直接处理整晚的 memmap。
+
+    参数:
+        ecg_data : ndarray      整条心电（可以是 memmap）
+        sampling_rate : float   采样率
+        block_seconds : float   块长（秒），窗口边界按块取整
+        chunk_blocks : int      每批处理的块数
+        baseline_seconds : float  基线滑动平均的窗长（秒），计算幂和、峰峰值前先减去基线
+
+    返回:
+        dict  各块的 'n', 's1'..'s4'（去基线信号相对 offset 的各阶幂和）, 'ptp'（去基线信号的峰峰值），
+              'min', 'max', 'n_min', 'n_max'（原始信号的最值及等于最值的点数，用于判断削波），
+              以及 'block_len', 'offset', 'scale'
+    """
+    n = len(ecg_data)
+    block_len = max(int(block_seconds * sampling_rate), 1)
+    n_blocks = -(-n // block_len)
+    half = max(int(baseline_seconds * sampling_rate / 2), 1)
+
+    def read_chunk(lo, hi):
+        """返回 (原始数据, 去基线数据)，两侧各多读 half 个点（记录两端按端点值延拓），块边界处的基线与整段计算一致"""
+        a, b = max(lo - half, 0), min(hi + half, n)
+        raw = np.asarray(ecg_data[a:b], dtype=np.float64)
+        x = np.pad(raw - raw[0], (half - (lo - a), half - (b - hi)), mode='edge')  # 减去首点，累加和不损失精度
+        csum = np.concatenate([[0.0], np.cumsum(x)])
+        baseline = (csum[2 * half + 1:] - csum[:-2 * half - 1]) / (2 * half + 1)
+        return raw[lo - a:hi - a], x[half:-half] - baseline
+
+    # 以第一段去基线数据的中位数和标准差做平移缩放，幂和在 float64 下不会损失精度
+    head = read_chunk(0, min(n, block_len * chunk_blocks))[1]
+    offset = float(np.median(head))
+    scale = float(np.std(head)) or 1.0
+
+    stats = {key: np.zeros(n_blocks)
+             for key in ('n', 's1', 's2', 's3', 's4', 'ptp', 'min', 'max', 'n_min', 'n_max')}
+    for b0 in range(0, n_blocks, chunk_blocks):
+        b1 = min(b0 + chunk_blocks, n_blocks)
+        lo, hi = b0 * block_len, min(b1 * block_len, n)
+        raw, x = read_chunk(lo, hi)
+        x = (x - offset) / scale
+        n_full = len(x) // block_len
+        parts = [(x[:n_full * block_len].reshape(n_full, block_len),
+                  raw[:n_full * block_len].reshape(n_full, block_len))]
+        if len(x) > n_full * block_len:  # 记录末尾不满一块
+            parts.append((x[n_full * block_len:][None, :], raw[n_full * block_len:][None, :]))
+        for k, (part, part_raw) in enumerate(parts):
+            idx = slice(b0 + (0 if k == 0 else n_full), b0 + (n_full if k == 0 else n_full + 1))
+            x2 = part * part
+            stats['n'][idx] = part.shape[1]
+            stats['s1'][idx] = part.sum(axis=1)
+            stats['s2'][idx] = x2.sum(axis=1)
+            stats['s3'][idx] = (x2 * part).sum(axis=1)
+            stats['s4'][idx] = (x2 * x2).sum(axis=1)
+            stats['ptp'][idx] = part.max(axis=1) - part.min(axis=1)
+            block_min = part_raw.min(axis=1)
+            block_max = part_raw.max(axis=1)
+            stats['min'][idx] = block_min
+            stats['max'][idx] = block_max
+            stats['n_min'][idx] = (part_raw == block_min[:, None]).sum(axis=1)
+            stats['n_max'][idx] = (part_raw == block_max[:, None]).sum(axis=1)
+
+    stats.update({'block_len': block_len, 'offset': offset, 'scale': scale})
+    return stats
+
+
+def window_quality(ecg_data, sampling_rate, starts, ends, block_seconds=1.0, thresholds=None, stats=None):
+    """
+    各窗口的信号质量指标和综合评分（全部向量化，整晚几百个窗口只需一次遍历心电）。
+
+    参数:
+        ecg_data : ndarray      整条心电（可以是 memmap）
+        sampling_rate : float   采样率
+        starts, ends : ndarray  窗口起止采样点（见 hrv_windows.window_bounds）
+        block_seconds : float   统计块长（秒）
+        thresholds : dict|None  覆盖 QUALITY_THRESHOLDS 中的部分阈值
+        stats : dict|None       已算好的 block_stats 结果（同一记录多次评估时复用）
+
+    返回:
+        dict  每个窗口一个值的数组：
+              'flat_fraction', 'clip_fraction', 'artifact_fraction', 'envelope', 'kurtosis',
+              'quality'（0–1 的综合评分）, 'quality_ok'（是否全部满足阈值）
+    """
+    limits = dict(QUALITY_THRESHOLDS)
+    if thresholds:
+        limits.update(thresholds)
+    if stats is None:
+        stats = block_stats(ecg_data, sampling_rate, block_seconds)
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    n_blocks = len(stats['n'])
+    block_len = stats['block_len']
+    b0 = np.clip(starts // block_len, 0, n_blocks - 1)
+    b1 = np.clip(np.maximum(-(-ends // block_len), b0 + 1), 1, n_blocks)
+
+    # 块级判定：去基线信号的幅度（峰峰值）相对整条记录中位数过小为平线，过大为伪迹；
+    # 原始信号块内有多个采样点恰好等于块的最大/最小值（平台）为削波，正常心电（包括量化后的数据）的峰值处只有一两个点相等
+    ptp = stats['ptp']
+    ref_ptp = np.median(ptp[stats['n'] == block_len]) if np.any(stats['n'] == block_len) else np.median(ptp)
+    ref_ptp = ref_ptp if ref_ptp > 0 else 1.0
+    flat = (ptp < 0.05 * ref_ptp) * stats['n']
+    artifact = (ptp > limits['envelope_high'] * ref_ptp) * stats['n']
+    plateau = max(3, 0.01 * block_len)
+    rails = ((stats['n_max'] >= plateau) * stats['n_max'] + (stats['n_min'] >= plateau) * stats['n_min']) \
+        * (~(ptp < 0.05 * ref_ptp))  # 平线块已单独计入
+
+    def window_sum(values):
+        csum = np.concatenate([[0.0], np.cumsum(values)])
+        return csum[b1] - csum[b0]
+
+    n = window_sum(stats['n'])
+    s1, s2, s3, s4 = (window_sum(stats[k]) for k in ('s1', 's2', 's3', 's4'))
+    mean = s1 / n
+    var = s2 / n - mean ** 2
+    m4 = (s4 - 4 * mean * s3 + 6 * mean ** 2 * s2) / n - 3 * mean ** 4
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kurtosis = np.where(var > 1e-12, m4 / var ** 2, 0.0)  # 平线窗口方差为 0，峭度记为 0
+
+    # 窗口幅度包络：窗口内各块峰峰值的中位数 / 整条记录的中位数
+    envelope = np.array([np.median(ptp[a:b]) for a, b in zip(b0, b1)]) / ref_ptp if len(b0) else np.array([])
+
+    flat_fraction = window_sum(flat) / n
+    clip_fraction = window_sum(rails) / n
+    artifact_fraction = window_sum(artifact) / n
+
+    quality_ok = ((flat_fraction <= limits['flat_fraction'])
+                  & (clip_fraction <= limits['clip_fraction'])
+                  & (artifact_fraction <= limits['artifact_fraction'])
+                  & (envelope >= limits['envelope_low']) & (envelope <= limits['envelope_high'])
+                  & (kurtosis >= limits['kurtosis']))
+    quality = ((1 - flat_fraction) * (1 - artifact_fraction) * (1 - np.minimum(clip_fraction, 1))
+               * np.minimum(kurtosis / limits['kurtosis'], 1))
+    return {
+        'flat_fraction': flat_fraction,
+        'clip_fraction': clip_fraction,
+        'artifact_fraction': artifact_fraction,
+        'envelope': envelope,
+        'kurtosis': kurtosis,
+        'quality': quality,
+        'quality_ok': quality_ok,
+    }
@@ -0,0 +1,163 @@
+# function: 可复现的合成心电：按给定心率、HRV、异位搏动比例生成 RR 序列，再用 ECGSYN 风格的高斯波形模板逐搏合成心电，
+#           附带白噪声、工频干扰和基线漂移；R 峰位置精确已知，可作为检测和 HRV 的参考。整晚（10 小时）几秒内生成
+# author: Zhangsong
+
+import numpy as np
+
+# 每搏波形：(名称, 相对 R 峰的时刻 ms, 宽度 ms, 幅度 mV)，参数参考 ECGSYN (McSharry 2003) 的 PQRST 高斯模型
+BEAT_WAVES = (
+    ('P', -200.0, 25.0, 0.15),
+    ('Q', -40.0, 12.0, -0.12),
+    ('R', 0.0, 16.0, 1.2),
+    ('S', 40.0, 12.0, -0.3),
+    ('T', 280.0, 45.0, 0.35),
+)
+# 室性早搏：无 P 波、QRS 宽大、T 波倒置
+ECTOPIC_WAVES = (
+    ('R', 0.0, 28.0, 1.6),
+    ('S', 60.0, 30.0, -0.5),
+    ('T', 300.0, 60.0, -0.45),
+)
+
+
+def simulate_rr(duration_seconds, heart_rate=65.0, hrv_std_ms=50.0, lf_hf_ratio=1.5, resp_rate=0.25,
+                ectopic_fraction=0.0, seed=0):
+    """
+    生成 RR 间期序列：平均心率 + LF(0.1 Hz Mayer 波) / HF(呼吸性窦性心律不齐) 正弦调制 + AR(1) 随机波动，
+    并按 ectopic_fraction 插入室性早搏（提前 40%，随后完全代偿间歇）。
+
+    参数:
+        duration_seconds : float  总时长（秒）
+        heart_rate : float        平均心率 (bpm)
+        hrv_std_ms : float        窦性 RR 的标准差 (ms)，大致等于 SDNN
+        lf_hf_ratio : float       LF 与 HF 调制的功率比
+        resp_rate : float         呼吸频率 (Hz)，HF 调制的频率
+        ectopic_fraction : float  早搏占全部心搏的比例
+        seed : int                随机种子，相同参数和种子得到相同结果
+
+    返回:
+        rr_ms : ndarray      RR 间期 (ms)
+        ectopic : ndarray    bool，每个间期结束处的心搏是否为早搏
+    """
+    rng = np.random.default_rng(seed)
+    mean_rr = 60000.0 / heart_rate
+    n = int(duration_seconds * 1000 / mean_rr) + 2
+    t = np.arange(n) * mean_rr / 1000  # 近似的搏动时刻，用于调制
+
+    # 三部分各占方差的一部分：LF、HF 正弦和随机波动
+    var = hrv_std_ms ** 2
+    var_hf = 0.6 * var / (1 + lf_hf_ratio)
+    var_lf = 0.6 * var - var_hf
+    var_ar = 0.4 * var
+    phase = rng.uniform(0, 2 * np.pi, 2)
+    rr = (mean_rr
+          + np.sqrt(2 * var_lf) * np.sin(2 * np.pi * 0.1 * t + phase[0])
+          + np.sqrt(2 * var_hf) * np.sin(2 * np.pi * resp_rate * t + phase[1]))
+    phi = 0.9
+    innovations = rng.normal(scale=np.sqrt(var_ar * (1 - phi ** 2)), size=n)
+    ar = np.empty(n)
+    ar[0] = rng.normal(scale=np.sqrt(var_ar))
+    for i in range(1, n):  # 逐搏递推，10 小时约 4 万搏
+        ar[i] = phi * ar[i - 1] + innovations[i]
+    rr = np.maximum(rr + ar, 300.0)
+
+    ectopic = np.zeros(n, dtype=bool)
+    if ectopic_fraction > 0:
+        # 早搏的前一个间期缩短为 60%，后一个间期补足，两者之和为两个正常间期
+        idx = np.flatnonzero(rng.random(n - 1) < ectopic_fraction)
+        idx = idx[np.concatenate([[True], np.diff(idx) > 1])] if len(idx) else idx  # 不连续出现
+        pair = rr[idx] + rr[idx + 1]
+        rr[idx] = 0.6 * rr[idx]
+        rr[idx + 1] = pair - rr[idx]
+        ectopic[idx] = True
+
+    total = np.cumsum(rr)
+    keep = total <= duration_seconds * 1000
+    return rr[keep], ectopic[keep]
+
+
+def _beat_template(waves, sampling_rate):
+    """
+    高斯和构成的单搏模板，返回 (相对 R 峰的采样点偏移, 幅度)。
+    """
+    left = min(c - 4 * w for _, c, w, _ in waves)
+    right = max(c + 4 * w for _, c, w, _ in waves)
+    offsets = np.arange(int(np.floor(left / 1000 * sampling_rate)), int(np.ceil(right / 1000 * sampling_rate)) + 1)
+    t_ms = offsets / sampling_rate * 1000
+    values = np.zeros(len(offsets))
+    for _, center, width, amp in waves:
+        values += amp * np.exp(-0.5 * ((t_ms - center) / width) ** 2)
+    return offsets, values
+
+
+def _add_beats(ecg, rpeaks, offsets, values, amplitudes, chunk_beats=2000):
+    """
+    把模板按各搏幅度叠加到 ecg 的对应位置（相邻心搏的模板可以重叠），按 chunk_beats 搏一批以控制内存。
+    """
+    n = len(ecg)
+    for k in range(0, len(rpeaks), chunk_beats):
+        peaks = rpeaks[k:k + chunk_beats]
+        idx = peaks[:, None] + offsets[None, :]
+        weights = amplitudes[k:k + chunk_beats, None] * values[None, :]
+        valid = (idx >= 0) & (idx < n)
+        idx, weights = idx[valid], weights[valid]
+        if not len(idx):
+            continue
+        base = idx.min()
+        ecg[base:idx.max() + 1] += np.bincount(idx - base, weights=weights)
+
+
+def simulate_ecg(duration_seconds, sampling_rate=1000, heart_rate=65.0, hrv_std_ms=50.0, ectopic_fraction=0.0,
+                 noise=0.02, powerline=0.02, powerline_freq=50.0, baseline=0.2, seed=0, dtype=np.float64,
+                 chunk_seconds=600):
+    """
+    合成一段心电。
+
+    参数:
+        duration_seconds : float  时长（秒），10 小时 1000 Hz 约 3600 万点
+        sampling_rate : float     采样率
+        heart_rate, hrv_std_ms, ectopic_fraction : 见 simulate_rr
+        noise : float             白噪声标准差 (mV)
+        powerline : float         工频干扰幅度 (mV)
+        powerline_freq : float    工频 (Hz)
+        baseline : float          基线漂移幅度 (mV)，0.15–0.3 Hz 呼吸样漂移加更慢的漂移
+        seed : int                随机种子
+        dtype : 输出类型，整晚长记录可用 np.float32 节省内存
+        chunk_seconds : float     噪声按段生成，控制临时数组大小
+
+    返回:
+        ecg : ndarray       合成心电
+        rpeaks : ndarray    R 峰采样点索引（真值）
+        ectopic : ndarray   bool，每个 R 峰是否为早搏
+    """
+    rr_ms, ectopic = simulate_rr(duration_seconds, heart_rate, hrv_std_ms, ectopic_fraction=ectopic_fraction, seed=seed)
+    # 第一个 R 峰放在 0.5 s 处，之后按 RR 累加
+    peak_times = 0.5 + np.concatenate([[0.0], np.cumsum(rr_ms[:-1]) / 1000])
+    ectopic = np.concatenate([[False], ectopic[:-1]])  # 第 k 个间期结束处是第 k+1 个 R 峰
+    n_samples = int(duration_seconds * sampling_rate)
+    rpeaks = np.round(peak_times * sampling_rate).astype(np.int64)
+    keep = rpeaks < n_samples
+    rpeaks, ectopic = rpeaks[keep], ectopic[keep]
+
+    rng = np.random.default_rng(seed + 1)
+    amplitudes = 1 + 0.05 * rng.normal(size=len(rpeaks))  # 逐搏幅度的轻微变化
+    ecg = np.zeros(n_samples, dtype=np.float64)
+    for waves, mask in ((BEAT_WAVES, ~ectopic), (ECTOPIC_WAVES, ectopic)):
+        if mask.any():
+            offsets, values = _beat_template(waves, sampling_rate)
+            _add_beats(ecg, rpeaks[mask], offsets, values, amplitudes[mask])
+
+    chunk = max(int(chunk_seconds * sampling_rate), 1)
+    phases = rng.uniform(0, 2 * np.pi, 3)
+    for start in range(0, n_samples, chunk):
+        end = min(start + chunk, n_samples)
+        t = np.arange(start, end) / sampling_rate
+        segment = ecg[start:end]
+        if noise > 0:
+            segment += noise * rng.normal(size=end - start)
+        if powerline > 0:
+            segment += powerline * np.sin(2 * np.pi * powerline_freq * t + phases[0])
+        if baseline > 0:
+            segment += baseline * (np.sin(2 * np.pi * 0.2 * t + phases[1])
+                                   + 0.5 * np.sin(2 * np.pi * 0.03 * t + phases[2]))
+    return ecg.astype(dtype, copy=False), rpeaks, ectopic
@@ -4,26 +4,12 @@ time: 2025-09-30
 function: 验证R波检测是否准确
 '''
 
-import plotly.express as px
-import pandas as pd
-import os
-import mne
-import pandas as pd
 import matplotlib.pyplot as plt
-from ecgdetectors import Detectors
-import neurokit2 as nk
 import numpy as np
 from matplotlib.widgets import Slider
-from hrvanalysis  import get_time_domain_features, get_frequency_domain_features, get_poincare_plot_features
-from hrvanalysis.preprocessing import (
-    remove_outliers,
-    remove_ectopic_beats,
-    interpolate_nan_values
-)
-import plotly.graph_objects as go
-
-import ipywidgets as widgets
-from IPython.display import display
+from ecg_io import read_edf_ecg
+from rpeak_detect import detect_rpeaks_chunked, detect_rpeaks_cleaned
+from peak_cache import cached_rpeaks
 
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 优先使用的中文字体列表
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号（-）显示为方块的问题
@@ -31,25 +17,14 @@ plt.rcParams['axes.unicode_minus'] = False  # 解决负号（-）显示为方块
 # 读取EDF文件
 edf_file = "D:\\研究生\\project\\整晚心率分析\\SLP013_Day1.edf"
 #edf_file = "D:\\研究生\\project\\整晚心率分析\\SLP012_Day2_up\\23点54分\\SLP012_Day2.edf"
-raw = mne.io.read_raw_edf(edf_file, preload=True)
-
-# 打印文件信息
-print(raw.info)
-
-# 获取所有通道数据 (data 是 numpy 数组, times 是时间轴)
-data, times = raw[:]
-
-#实验采样率
-sampling_rate = raw.info['sfreq']
-
-#提取心电数据
-ecg_data = data[raw.ch_names.index('ECG'), :]
+#提取心电数据（只惰性读取心电通道，不预加载全部通道）
+ecg_data, sampling_rate = read_edf_ecg(edf_file, use_cache=True)
+print(f"采样率: {sampling_rate}")
 ecg_segment = ecg_data[:int(sampling_rate * 60)] #去前60s数据
 # 移除 RR 间期数据中的异常值（离群点）
-ecg_cleaned = nk.ecg_clean(ecg_data, sampling_rate=sampling_rate)
-
-signals, info = nk.ecg_peaks(ecg_cleaned, sampling_rate=sampling_rate)
-rpeaks = info["ECG_R_Peaks"]
+# 先 ecg_clean 再检测，整晚分块进行以限制内存；结果按文件和参数缓存，再次打开同一晚时不必重新检测
+rpeaks = cached_rpeaks(edf_file, ecg_data, sampling_rate, params={'ecg_clean': True},
+                       detect_fn=lambda x, fs: detect_rpeaks_chunked(x, fs, detect_fn=detect_rpeaks_cleaned))
 
 '''画图'''
 '''